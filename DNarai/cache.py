@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import math
+import random
+import re
+import time
+from collections import Counter
+from functools import wraps
+
+import redis
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+
+from .metrics import CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "ns:{}:version"
+LOCK_TIMEOUT = 30  # seconds a recomputation may hold the lock
+
+PAGES_NAMESPACE = "pages"
+FRAGMENTS = ("navbar_anonymous",)
+CSRF_PLACEHOLDER = "__csrf_token__"
+CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+# (namespace, "hit" | "miss" | "early" | "stale") -> count, for this process
+stats = Counter()
+
+
+def _count(namespace, outcome):
+    stats[(namespace, outcome)] += 1
+    CACHE_LOOKUPS.labels(namespace, outcome).inc()
+
+
+def namespace_version(namespace):
+    version = cache.get(VERSION_KEY.format(namespace))
+    if version is None:
+        cache.add(VERSION_KEY.format(namespace), 1, timeout=None)
+        version = cache.get(VERSION_KEY.format(namespace), 1)
+    return version
+
+
+def make_key(namespace, *parts):
+    """
+    ``namespace:v<version>:<parts>``. Bumping the namespace version with
+    ``invalidate`` orphans every key in it at once; Redis evicts them later.
+    """
+    suffix = ":".join(str(part) for part in parts)
+    if len(suffix) > 100:
+        suffix = hashlib.sha1(suffix.encode()).hexdigest()
+    return f"{namespace}:v{namespace_version(namespace)}:{suffix}"
+
+
+def invalidate(namespace):
+    """Drops every cached entry in ``namespace``."""
+    try:
+        cache.incr(VERSION_KEY.format(namespace))
+    except ValueError:
+        # Version key evicted or never set; any new version differs from the old keys
+        cache.set(VERSION_KEY.format(namespace), int(time.time()), timeout=None)
+
+
+def get_or_compute(namespace, parts, compute, timeout=300, beta=1.0):
+    """
+    Returns the cached value for ``parts`` in ``namespace``, calling
+    ``compute()`` to fill it.
+
+    Stampedes are avoided two ways: a value is recomputed a little before it
+    expires with a probability that grows as expiry approaches (XFetch, scaled
+    by how long ``compute`` took and ``beta``), and only the process holding
+    a short lock recomputes while others keep serving the old value. On a
+    cold miss without the lock, callers compute anyway rather than wait.
+    If the cache is unavailable, ``compute()`` is called directly.
+    """
+    try:
+        key = make_key(namespace, *parts)
+        entry = cache.get(key)
+        now = time.time()
+        if entry is not None:
+            value, delta, expiry = entry
+            if now - delta * beta * math.log(1 - random.random()) < expiry:
+                _count(namespace, "hit")
+                return value
+            if not cache.add(f"{key}:lock", 1, timeout=LOCK_TIMEOUT):
+                # Someone else is already refreshing it
+                _count(namespace, "stale")
+                return value
+            _count(namespace, "early")
+        else:
+            _count(namespace, "miss")
+            cache.add(f"{key}:lock", 1, timeout=LOCK_TIMEOUT)
+    except redis.RedisError:
+        logger.warning("[Cache] Unavailable, computing directly", exc_info=True)
+        return compute()
+
+    started = time.time()
+    value = compute()
+    delta = time.time() - started
+    try:
+        cache.set(key, (value, delta, time.time() + timeout), timeout=timeout)
+        cache.delete(f"{key}:lock")
+    except redis.RedisError:
+        logger.warning("[Cache] Could not store %s", key, exc_info=True)
+    return value
+
+
+def hit_ratio(namespace=None):
+    """Fraction of lookups served from the cache in this process."""
+    served = sum(n for (ns, outcome), n in stats.items() if outcome in ("hit", "stale") and namespace in (None, ns))
+    total = sum(n for (ns, _), n in stats.items() if namespace in (None, ns))
+    return served / total if total else 0.0
+
+
+def _is_anonymous(request):
+    # Checked on cookies so a cache hit never loads the session
+    return settings.SESSION_COOKIE_NAME not in request.COOKIES and CookieStorage.cookie_name not in request.COOKIES
+
+
+def cached_page(name, statuses=(200,), anonymous_only=True):
+    """
+    Caches the response of a GET view in the shared cache under ``name``
+    (the query string is ignored, so campaign parameters share one entry).
+
+    With ``anonymous_only``, requests carrying a session or messages cookie
+    bypass the cache, since their pages may show a user or flash messages.
+    CSRF tokens are stored as a placeholder and filled in with the
+    requester's own token on every hit.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                not settings.PAGE_CACHE_SECONDS
+                or request.method not in ("GET", "HEAD")
+                or (anonymous_only and not _is_anonymous(request))
+            ):
+                return view(request, *args, **kwargs)
+
+            try:
+                key = make_key(PAGES_NAMESPACE, name)
+                entry = cache.get(key)
+            except redis.RedisError:
+                logger.warning("[Cache] Unavailable, rendering page directly", exc_info=True)
+                return view(request, *args, **kwargs)
+
+            if entry is None:
+                _count(PAGES_NAMESPACE, "miss")
+                response = view(request, *args, **kwargs)
+                if response.status_code in statuses and not response.cookies and not response.streaming:
+                    content = CSRF_INPUT_RE.sub(rf"\g<1>{CSRF_PLACEHOLDER}\g<2>", response.content.decode())
+                    try:
+                        cache.set(
+                            key,
+                            (response.status_code, response["Content-Type"], content),
+                            timeout=settings.PAGE_CACHE_SECONDS,
+                        )
+                    except redis.RedisError:
+                        logger.warning("[Cache] Could not store %s", key, exc_info=True)
+            else:
+                _count(PAGES_NAMESPACE, "hit")
+                status, content_type, content = entry
+                if CSRF_PLACEHOLDER in content:
+                    content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+                response = HttpResponse(content, status=status, content_type=content_type)
+
+            if anonymous_only:
+                patch_vary_headers(response, ("Cookie",))
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate_pages():
+    """
+    Drops cached pages everywhere and template fragments in this process.
+    Called when lookup data changes and after deploys (``invalidate_page_cache``).
+    """
+    invalidate(PAGES_NAMESPACE)
+    caches["fragments"].delete_many([make_template_fragment_key(name) for name in FRAGMENTS])
@@ -1,5 +1,20 @@
+import cProfile
+import logging
 import os
+import random
+import time
+
 from celery import Celery
+from celery.signals import (
+    task_failure,
+    task_postrun,
+    task_prerun,
+    task_retry,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+    worker_shutdown,
+)
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DNarai.settings')
 
@@ -8,3 +23,171 @@ app = Celery('DNarai')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+
+# Pools inherited from the parent; kept referenced so garbage collection never
+# closes the parent's sockets from a child.
+_inherited_db_pools = []
+
+
+@worker_process_init.connect
+def reset_db_pools(**kwargs):
+    """
+    Gives each prefork child its own psycopg pool (DB_POOL_MODE=pool).
+    Plain connections inherited from the parent are already discarded, and
+    stale ones recycled around each task, by Celery's Django fixup.
+    """
+    from django.db import connections
+
+    for alias in connections:
+        if connections.settings[alias].get("OPTIONS", {}).get("pool"):
+            pools = type(connections[alias])._connection_pools
+            if alias in pools:
+                _inherited_db_pools.append(pools.pop(alias))
+
+
+@worker_process_shutdown.connect
+def close_db_connections(**kwargs):
+    from django.db import connections
+
+    connections.close_all()
+    for alias in connections:
+        if connections.settings[alias].get("OPTIONS", {}).get("pool"):
+            connections[alias].close_pool()
+
+
+@worker_process_init.connect
+def warm_email_templates(**kwargs):
+    from core.emails import warm_email_templates
+
+    warm_email_templates()
+
+
+# ------------------------------
+# Task IDs on log records
+# ------------------------------
+@task_prerun.connect
+def tag_task_logs(task_id=None, **kwargs):
+    from DNarai import log
+
+    log.task_prerun(task_id)
+
+
+@task_postrun.connect
+def untag_task_logs(**kwargs):
+    from DNarai import log
+
+    log.task_postrun()
+
+
+# ------------------------------
+# Task profiling
+# ------------------------------
+_task_profiles = {}
+
+
+@worker_process_init.connect
+def install_profiling_hooks(**kwargs):
+    from DNarai import profiling
+
+    profiling.install()
+
+
+@task_prerun.connect
+def start_task_profile(task_id=None, task=None, **kwargs):
+    """
+    Counts the task's queries, template and SMTP time, and with probability
+    TASK_PROFILE_SAMPLE_RATE runs it under cProfile.
+    """
+    from django.conf import settings
+
+    from DNarai import profiling
+
+    profile, token = profiling.activate()
+    profiler = None
+    if settings.TASK_PROFILE_SAMPLE_RATE and random.random() < settings.TASK_PROFILE_SAMPLE_RATE:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    _task_profiles[task_id] = (profile, token, time.process_time(), profiler)
+
+
+@task_postrun.connect
+def finish_task_profile(task_id=None, task=None, state=None, **kwargs):
+    from django.conf import settings
+
+    from DNarai import metrics, profiling
+
+    entry = _task_profiles.pop(task_id, None)
+    if entry is None:
+        return
+    profile, token, cpu_started, profiler = entry
+    profiling.deactivate(token)
+    wall = time.perf_counter() - profile.started
+    cpu = time.process_time() - cpu_started
+
+    metrics.TASK_CPU.labels(task.name).observe(cpu)
+    metrics.TASK_QUERIES.labels(task.name).observe(len(profile.queries))
+
+    if profiler is not None:
+        profiler.disable()
+        os.makedirs(settings.TASK_PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.TASK_PROFILE_DIR, f"{task.name}-{int(time.time())}-{task_id}.prof")
+        profiler.dump_stats(path)
+        logger.info("[Task Profile] Wrote %s", path)
+
+    if wall >= settings.TASK_SLOW_SECONDS:
+        logger.warning(
+            "[Task Profile] Slow task %s (%s, %s): wall=%.2fs cpu=%.2fs queries=%d duplicates=%d "
+            "db=%.2fs templates=%.2fs smtp=%.2fs broker=%.2fs",
+            task.name,
+            task_id,
+            state,
+            wall,
+            cpu,
+            len(profile.queries),
+            profile.duplicates(),
+            profile.db_seconds,
+            profile.template_seconds,
+            profile.smtp_seconds,
+            profile.publish_seconds,
+        )
+
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def close_email_connections(**kwargs):
+    from core.email_pool import email_pool
+
+    email_pool.close_all()
+
+
+@worker_init.connect
+def setup_metrics(**kwargs):
+    """
+    Records task metrics and, with CELERY_METRICS_PORT set, serves every
+    pool process's merged metrics from the main worker process.
+    """
+    from DNarai import metrics
+
+    task_prerun.connect(metrics.task_prerun, weak=False)
+    task_postrun.connect(metrics.task_postrun, weak=False)
+    task_retry.connect(metrics.task_retry, weak=False)
+    task_failure.connect(metrics.task_failure, weak=False)
+
+    port = os.getenv("CELERY_METRICS_PORT")
+    if port:
+        from prometheus_client import start_http_server
+
+        start_http_server(int(port), registry=metrics.registry())
+
+
+@worker_process_shutdown.connect
+def forget_process_metrics(pid=None, **kwargs):
+    from DNarai.metrics import MULTIPROCESS
+
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,204 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .metrics import DB_READ_ROUTES, REPLICA_LAG
+
+logger = logging.getLogger(__name__)
+
+# Replay lag of a Postgres standby; 0 when it has replayed everything it
+# received (an idle primary doesn't advance the replay timestamp).
+LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+class RoutingState:
+    """Per request (or ``use_replica`` block outside a request)."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned  # read from the primary only
+        self.wrote = False
+
+
+_state = ContextVar("db_routing_state", default=None)
+_replica_reads = ContextVar("db_replica_reads", default=False)
+
+# alias -> (checked_at, lag in seconds or None if unreachable), for this process
+_lag = {}
+
+
+def replica_lag(alias):
+    """Replication lag of ``alias``, checked at most every REPLICA_LAG_CHECK_SECONDS."""
+    now = time.monotonic()
+    checked_at, lag = _lag.get(alias, (0.0, None))
+    if checked_at and now - checked_at < settings.REPLICA_LAG_CHECK_SECONDS:
+        return lag
+
+    connection = connections[alias]
+    try:
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = float(cursor.fetchone()[0] or 0)
+        else:
+            lag = 0.0
+    except DatabaseError:
+        logger.warning("[Replicas] Could not read the lag of %s", alias, exc_info=True)
+        connection.close()
+        lag = None
+    _lag[alias] = (now, lag)
+    if lag is not None:
+        REPLICA_LAG.labels(alias).set(lag)
+    return lag
+
+
+def _pick_replica():
+    usable = [
+        alias for alias in settings.REPLICA_DATABASES
+        if (lag := replica_lag(alias)) is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+    ]
+    return random.choice(usable) if usable else None
+
+
+class ReplicaRouter:
+    """
+    Writes, and reads by default, go to the primary. Reads inside
+    ``use_replica()`` (or views decorated with ``replica_reads``) go to a
+    replica that is less than REPLICA_MAX_LAG_SECONDS behind, unless the
+    request has written, carries the pin cookie or is inside a transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+
+        state = _state.get()
+        if state is not None and (state.pinned or state.wrote):
+            reason = "pinned"
+        elif connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            reason = "transaction"
+        elif alias := _pick_replica():
+            DB_READ_ROUTES.labels(alias, "replica").inc()
+            return alias
+        else:
+            reason = "no_replica"
+        DB_READ_ROUTES.labels(DEFAULT_DB_ALIAS, reason).inc()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_replica():
+    """Lets reads in this block that can tolerate REPLICA_MAX_LAG_SECONDS of staleness use a replica."""
+    state_token = _state.set(RoutingState()) if _state.get() is None else None
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+        if state_token is not None:
+            _state.reset(state_token)
+
+
+def replica_reads(view):
+    """Runs a view (sync or async) inside ``use_replica()``."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            with use_replica():
+                return await view(*args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with use_replica():
+                return view(*args, **kwargs)
+    return wrapper
+
+
+class ReplicaChangelistMixin:
+    """ModelAdmin mixin serving changelist GETs from a replica."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "GET":
+            return super().changelist_view(request, extra_context)
+        with use_replica():
+            response = super().changelist_view(request, extra_context)
+            # Render now; the queries run while the template is rendered
+            if hasattr(response, "render"):
+                response.render()
+        return response
+
+
+class ReplicaPinningMiddleware:
+    """
+    Keeps a client on the primary for REPLICA_PIN_SECONDS after a request of
+    theirs writes, so they read their own changes (a new booking, a verified
+    account) even if the replicas are behind.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REPLICA_DATABASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self._finish(state, response)
+
+    def _start(self, request):
+        state = RoutingState(pinned=settings.REPLICA_PIN_COOKIE in request.COOKIES)
+        return state, _state.set(state)
+
+    def _finish(self, state, response):
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                "1",
+                max_age=settings.REPLICA_PIN_SECONDS,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,219 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+_request_id = ContextVar("request_id", default=None)
+_task_id = ContextVar("task_id", default=None)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+# Accept IDs from the proxy only if they look like one
+REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+# ------------------------------
+# Request and task IDs
+# ------------------------------
+class ContextFilter(logging.Filter):
+    """Adds ``request_id`` and ``task_id`` to records, in the thread that logs them."""
+
+    def filter(self, record):
+        # django.request logs 4xx/5xx after the middleware has returned
+        record.request_id = _request_id.get() or getattr(getattr(record, "request", None), "request_id", None)
+        record.task_id = _task_id.get()
+        return True
+
+
+def task_prerun(task_id):
+    """Called around each Celery task (see DNarai/celery.py)."""
+    _task_id.set(task_id)
+
+
+def task_postrun():
+    _task_id.set(None)
+
+
+class RequestIdMiddleware:
+    """
+    Gives each request an ID (the proxy's X-Request-ID if it sent a valid
+    one), adds it to log records and echoes it in the response.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request_id, token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    async def __acall__(self, request):
+        request_id, token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response[REQUEST_ID_HEADER] = request_id
+        return response
+
+    def _start(self, request):
+        request_id = request.headers.get(REQUEST_ID_HEADER, "")
+        if not REQUEST_ID_RE.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        return request_id, _request_id.set(request_id)
+
+
+# ------------------------------
+# Formatting
+# ------------------------------
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including request/task IDs and ``extra`` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "task_id": getattr(record, "task_id", None),
+            "process": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+# ------------------------------
+# Queued output
+# ------------------------------
+def _file_handler(filename, rotation, max_bytes, when, backup_count):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    if rotation == "size":
+        return logging.handlers.RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+    if rotation == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            filename, when=when, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+    # "external": logrotate moves the file; reopen it when that happens
+    return logging.handlers.WatchedFileHandler(filename, encoding="utf-8", delay=True)
+
+
+class QueuedHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on an in-memory queue and returns; a listener thread formats
+    them and writes them to the log file and optionally the console.
+
+    With ``rotation="external"`` logrotate moves the file and the handler
+    reopens it, which is safe with any number of processes. ``"size"`` and
+    ``"time"`` rotate in-process, so use them only when one process writes
+    the file.
+
+    The message is interpolated in the logging thread, so later changes to
+    the arguments don't show up, but JSON encoding and all I/O happen on the
+    listener. When the queue is full, records are dropped rather than
+    blocking the caller, and the number dropped is logged once there is room.
+    After a fork (Celery prefork children) the child starts its own queue and
+    listener, since the parent's thread doesn't exist there.
+    """
+
+    def __init__(self, filename, rotation="external", max_bytes=20 * 1024 * 1024, when="midnight",
+                 backup_count=10, console=True, structured=True, queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        if structured:
+            formatter = JsonFormatter()
+        else:
+            formatter = logging.Formatter("{levelname} {asctime} {name} {message}", style="{")
+        self.targets = [_file_handler(str(filename), rotation, max_bytes, when, backup_count)]
+        if console:
+            self.targets.append(logging.StreamHandler(sys.stderr))
+        for target in self.targets:
+            target.setFormatter(formatter)
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.closed = False
+        self._start_listener()
+        atexit.register(self._stop_listener)
+        os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _start_listener(self):
+        self.listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+
+    def _stop_listener(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        for target in self.targets:
+            target.close()
+
+    def _restart_after_fork(self):
+        if self.closed:
+            return
+        # The parent's queue may have been locked mid-put; start clean
+        self.queue = queue.Queue(self.queue_size)
+        self.dropped = 0
+        self._start_listener()
+
+    def prepare(self, record):
+        # Not copied: the loggers using this handler have no other handlers
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if self.dropped:
+                warning = logging.makeLogRecord({
+                    "name": __name__,
+                    "levelno": logging.WARNING,
+                    "levelname": "WARNING",
+                    "msg": "[Logging] Queue full, dropped %d records",
+                    "args": (self.dropped,),
+                })
+                self.queue.put_nowait(warning)
+                self.dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.closed = True
+        self._stop_listener()
+        super().close()
@@ -0,0 +1,209 @@
+import hmac
+import logging
+import os
+import time
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+logger = logging.getLogger(__name__)
+
+# With PROMETHEUS_MULTIPROC_DIR set (gunicorn, Celery prefork), every process
+# writes its samples to files in that directory and scrapes merge them.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+REQUEST_LATENCY = Histogram(
+    "django_request_duration_seconds",
+    "Time from the first middleware to the response, per view",
+    ["view", "method"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUESTS = Counter("django_requests_total", "Responses per view and status code", ["view", "method", "status"])
+
+TASK_RUNTIME = Histogram(
+    "celery_task_duration_seconds",
+    "Task run time in the worker",
+    ["task"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+TASK_CPU = Histogram(
+    "celery_task_cpu_seconds",
+    "CPU time used by the worker process while running a task",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+TASK_QUERIES = Histogram(
+    "celery_task_queries",
+    "Database queries run by a task",
+    ["task"],
+    buckets=(0, 1, 2, 5, 10, 25, 50, 100, 250, 1000),
+)
+TASK_EVENTS = Counter("celery_task_events_total", "Task outcomes (succeeded, retried, failed)", ["task", "event"])
+
+SMTP_SEND_LATENCY = Histogram(
+    "smtp_send_duration_seconds",
+    "Time to hand one message to the SMTP server",
+    ["outcome"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30),
+)
+
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Lookups through DNarai.cache", ["namespace", "outcome"])
+
+DB_READ_ROUTES = Counter(
+    "db_read_routes_total",
+    "Replica-eligible reads by the database chosen and why (replica, pinned, transaction, no_replica)",
+    ["database", "reason"],
+)
+REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds", "Replication lag last seen by this process", ["database"], multiprocess_mode="max"
+)
+
+
+# ------------------------------
+# Web requests
+# ------------------------------
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "<unresolved>"
+
+
+def _observe_request(request, response, started):
+    view, method = _view_name(request), request.method
+    REQUEST_LATENCY.labels(view, method).observe(time.perf_counter() - started)
+    REQUESTS.labels(view, method, str(response.status_code)).inc()
+
+
+class PrometheusMiddleware:
+    """Records latency and status per view. Goes first in MIDDLEWARE."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        _observe_request(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        _observe_request(request, response, started)
+        return response
+
+
+# ------------------------------
+# Celery tasks (connected in DNarai/celery.py)
+# ------------------------------
+_task_started = {}
+
+
+def task_prerun(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+def task_postrun(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        TASK_RUNTIME.labels(task.name).observe(time.perf_counter() - started)
+    if state == "SUCCESS":
+        TASK_EVENTS.labels(task.name, "succeeded").inc()
+
+
+def task_retry(request=None, **kwargs):
+    TASK_EVENTS.labels(request.task, "retried").inc()
+
+
+def task_failure(sender=None, **kwargs):
+    TASK_EVENTS.labels(sender.name, "failed").inc()
+
+
+# ------------------------------
+# Scrape-time gauges
+# ------------------------------
+_broker_client = None
+
+
+def broker_redis():
+    """Redis client for the Celery broker, shared by every scrape."""
+    global _broker_client
+    if _broker_client is None:
+        _broker_client = redis.Redis.from_url(settings.CELERY_BROKER_URL, socket_timeout=settings.REDIS_SOCKET_TIMEOUT)
+    return _broker_client
+
+
+class BacklogCollector:
+    """
+    Values read when /metrics is scraped rather than tracked per process:
+    broker queue depth, outbox backlog and rate-limit rejections.
+    """
+
+    def collect(self):
+        depth = GaugeMetricFamily("celery_queue_length", "Messages waiting in the broker queue", labels=["queue"])
+        if settings.CELERY_BROKER_URL.startswith("redis"):
+            try:
+                client = broker_redis()
+                for queue in settings.METRICS_CELERY_QUEUES:
+                    depth.add_metric([queue], client.llen(queue))
+            except redis.RedisError:
+                logger.warning("[Metrics] Could not read the broker queue length", exc_info=True)
+        yield depth
+
+        from core.models import EmailOutbox
+
+        pending = EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING)
+        oldest = pending.order_by("created_at").values_list("created_at", flat=True).first()
+        yield GaugeMetricFamily("email_outbox_pending", "Emails waiting to be sent", value=pending.count())
+        yield GaugeMetricFamily(
+            "email_outbox_oldest_pending_seconds",
+            "Age of the oldest email waiting to be sent",
+            value=time.time() - oldest.timestamp() if oldest else 0,
+        )
+
+        from .ratelimit import shed_counts
+
+        shed = CounterMetricFamily("ratelimit_shed", "Requests rejected by rate limits", labels=["scope"])
+        try:
+            for scope, count in shed_counts().items():
+                shed.add_metric([scope], count)
+        except redis.RedisError:
+            logger.warning("[Metrics] Could not read rate-limit counts", exc_info=True)
+        yield shed
+
+
+def registry():
+    """Registry merging every process's samples when running multiprocess."""
+    if not MULTIPROCESS:
+        return REGISTRY
+    merged = CollectorRegistry()
+    MultiProcessCollector(merged)
+    return merged
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Needs ``Authorization: Bearer <METRICS_TOKEN>``
+    or a logged-in staff user.
+    """
+    authorization = request.headers.get("Authorization", "")
+    token_ok = bool(settings.METRICS_TOKEN) and hmac.compare_digest(
+        authorization.encode(), f"Bearer {settings.METRICS_TOKEN}".encode()
+    )
+    if not token_ok and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    backlog = CollectorRegistry()
+    backlog.register(BacklogCollector())
+    return HttpResponse(generate_latest(registry()) + generate_latest(backlog), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,218 @@
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from celery.signals import after_task_publish, before_task_publish
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+# Profile of the request being handled; copied into sync_to_async threads
+_current = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, params, seconds)
+        self.template_seconds = 0.0
+        self.publish_seconds = 0.0
+        self.publishes = 0
+        self.smtp_seconds = 0.0
+        self._publish_started = {}
+
+    @property
+    def db_seconds(self):
+        return sum(seconds for _, _, seconds in self.queries)
+
+    def duplicates(self):
+        """Number of queries that repeat an earlier one with the same parameters."""
+        counts = Counter((sql, repr(params)) for sql, params, _ in self.queries)
+        return sum(n - 1 for n in counts.values())
+
+    def slowest(self, n):
+        return sorted(self.queries, key=lambda q: q[2], reverse=True)[:n]
+
+    def server_timing(self, total):
+        return ", ".join([
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{len(self.queries)} queries"',
+            f"tpl;dur={self.template_seconds * 1000:.1f}",
+            f'broker;dur={self.publish_seconds * 1000:.1f};desc="{self.publishes} publishes"',
+            f"smtp;dur={self.smtp_seconds * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+
+def activate():
+    """Starts profiling the current request or task; returns a token for ``deactivate``."""
+    profile = RequestProfile()
+    return profile, _current.set(profile)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def record_smtp(seconds):
+    profile = _current.get()
+    if profile is not None:
+        profile.smtp_seconds += seconds
+
+
+# ------------------------------
+# Hooks; they do nothing unless a profiled request is in progress
+# ------------------------------
+def _profile_execute(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries.append((sql, params, time.perf_counter() - started))
+
+
+def _add_execute_wrapper(sender, connection, **kwargs):
+    if _profile_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_profile_execute)
+
+
+def _before_publish(headers=None, **kwargs):
+    profile = _current.get()
+    if profile is not None:
+        profile._publish_started[headers.get("id")] = time.perf_counter()
+
+
+def _after_publish(headers=None, **kwargs):
+    profile = _current.get()
+    if profile is not None:
+        started = profile._publish_started.pop(headers.get("id"), None)
+        if started is not None:
+            profile.publish_seconds += time.perf_counter() - started
+            profile.publishes += 1
+
+
+_original_render = Template.render
+
+
+def _profiled_render(self, context=None, request=None):
+    profile = _current.get()
+    if profile is None:
+        return _original_render(self, context, request)
+    started = time.perf_counter()
+    try:
+        return _original_render(self, context, request)
+    finally:
+        profile.template_seconds += time.perf_counter() - started
+
+
+def install():
+    """Hooks the database, template and Celery publish paths once per process."""
+    if Template.render is _profiled_render:
+        return
+    Template.render = _profiled_render
+    connection_created.connect(_add_execute_wrapper, weak=False)
+    for connection in connections.all(initialized_only=True):
+        _add_execute_wrapper(None, connection)
+    before_task_publish.connect(_before_publish, weak=False)
+    after_task_publish.connect(_after_publish, weak=False)
+
+
+# ------------------------------
+# Middleware
+# ------------------------------
+def _should_profile(request):
+    path = request.path
+    if any(path.startswith(prefix) for prefix in settings.PROFILING_EXCLUDE_PATHS):
+        return False
+    if settings.PROFILING_PATHS and not any(path.startswith(prefix) for prefix in settings.PROFILING_PATHS):
+        return False
+    return random.random() < settings.PROFILING_SAMPLE_RATE
+
+
+def _report(request, response, profile):
+    total = time.perf_counter() - profile.started
+    response["Server-Timing"] = profile.server_timing(total)
+    slowest = [
+        {"ms": round(seconds * 1000, 1), "sql": sql[:300]}
+        for sql, _, seconds in profile.slowest(settings.PROFILING_SLOWEST_QUERIES)
+    ]
+    logger.info(
+        "[Profile] %s %s %d total=%.1fms queries=%d duplicates=%d db=%.1fms templates=%.1fms "
+        "broker=%.1fms smtp=%.1fms",
+        request.method,
+        request.path,
+        response.status_code,
+        total * 1000,
+        len(profile.queries),
+        profile.duplicates(),
+        profile.db_seconds * 1000,
+        profile.template_seconds * 1000,
+        profile.publish_seconds * 1000,
+        profile.smtp_seconds * 1000,
+        extra={"profile": {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 1),
+            "queries": len(profile.queries),
+            "duplicate_queries": profile.duplicates(),
+            "db_ms": round(profile.db_seconds * 1000, 1),
+            "template_ms": round(profile.template_seconds * 1000, 1),
+            "broker_ms": round(profile.publish_seconds * 1000, 1),
+            "smtp_ms": round(profile.smtp_seconds * 1000, 1),
+            "publishes": profile.publishes,
+            "slowest": slowest,
+        }},
+    )
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in (PROFILING_ENABLED) profiler for a sample of requests. Adds a
+    Server-Timing header with DB, template and broker time and logs the
+    query count, duplicate queries and slowest statements.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        install()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not _should_profile(request):
+            return self.get_response(request)
+        profile, token = activate()
+        try:
+            response = self.get_response(request)
+        finally:
+            deactivate(token)
+        _report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        if not _should_profile(request):
+            return await self.get_response(request)
+        profile, token = activate()
+        try:
+            response = await self.get_response(request)
+        finally:
+            deactivate(token)
+        _report(request, response, profile)
+        return response
@@ -0,0 +1,192 @@
+import hashlib
+import ipaddress
+import logging
+import math
+import re
+import time
+from functools import wraps
+
+import redis
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+RATE_RE = re.compile(r"^(\d+)/(\d*)([smhd])$")
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+SHED_KEY = "ratelimit:shed"
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60), '5/15m' -> (5, 900)"""
+    match = RATE_RE.match(rate)
+    if not match:
+        raise ValueError(f"Invalid rate {rate!r}")
+    limit, multiplier, unit = match.groups()
+    return int(limit), int(multiplier or 1) * PERIODS[unit]
+
+
+def _is_trusted_proxy(address):
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in settings.RATELIMIT_TRUSTED_PROXIES)
+
+
+def client_ip(request):
+    """
+    The address requests are limited by. REMOTE_ADDR, unless the app is
+    behind a proxy that appends to X-Forwarded-For (nginx in docker-compose):
+    then the right-most entry that isn't one of RATELIMIT_TRUSTED_PROXIES.
+    Entries to its left were sent by the client and can be anything.
+    """
+    remote_addr = request.META.get("REMOTE_ADDR", "")
+    if not settings.RATELIMIT_TRUST_PROXY_HEADERS:
+        return remote_addr
+    hops = [hop.strip() for hop in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else remote_addr
+
+
+def _post_value(*fields):
+    def key(request):
+        for field in fields:
+            value = request.POST.get(field, "").strip().lower()
+            if value:
+                return value
+        return None
+    return key
+
+
+KEY_FUNCTIONS = {
+    "ip": client_ip,
+    "account": _post_value("username", "email"),  # login accepts either in "email"
+    "email": _post_value("email"),
+}
+
+
+def hit(scope, identity, rate):
+    """
+    Counts one request against a sliding-window counter and returns
+    ``(allowed, retry_after_seconds)``.
+
+    The window is approximated from the current and previous fixed windows
+    (weighted by how far we are into the current one), which needs two
+    small counters per identity instead of a log of timestamps.
+    """
+    limit, period = parse_rate(rate)
+    now = time.time()
+    window = int(now // period)
+    digest = hashlib.sha1(identity.encode()).hexdigest()[:16]
+    current_key = f"ratelimit:{scope}:{window}:{digest}"
+    previous_key = f"ratelimit:{scope}:{window - 1}:{digest}"
+
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.incr(current_key)
+    pipe.expire(current_key, period * 2)
+    pipe.get(previous_key)
+    current, _, previous = pipe.execute()
+
+    elapsed = now - window * period
+    estimate = int(previous or 0) * (period - elapsed) / period + current
+    if estimate <= limit:
+        return True, 0
+    return False, max(1, math.ceil(period - elapsed))
+
+
+def check(request, scope, keys):
+    """
+    Returns a 429 response if any of ``keys`` is over its budget in
+    ``RATELIMIT_RATES[f"{scope}:{key}"]``, otherwise None. Fails open if
+    Redis is unavailable.
+    """
+    if not settings.RATELIMIT_ENABLED:
+        return None
+
+    try:
+        for key in keys:
+            rate = settings.RATELIMIT_RATES.get(f"{scope}:{key}")
+            identity = KEY_FUNCTIONS[key](request)
+            if not rate or not identity:
+                continue
+            allowed, retry_after = hit(f"{scope}:{key}", identity, rate)
+            if not allowed:
+                get_redis().hincrby(SHED_KEY, f"{scope}:{key}", 1)
+                logger.warning("[Rate Limit] Shed %s %s (%s:%s)", request.method, request.path, scope, key)
+                response = HttpResponse("Too many requests. Please try again later.", status=429)
+                response["Retry-After"] = str(retry_after)
+                return response
+    except redis.RedisError:
+        logger.warning("[Rate Limit] Redis unavailable, not limiting", exc_info=True)
+    return None
+
+
+def shed_counts():
+    """Requests rejected so far, per ``scope:key``."""
+    return {k.decode(): int(v) for k, v in get_redis().hgetall(SHED_KEY).items()}
+
+
+def ratelimit(scope, keys=("ip",), methods=("POST",)):
+    """
+    View decorator applying the ``scope`` budgets before the view runs, so
+    rejected requests cost no ORM queries or password hashing. Works on
+    both sync and async views.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method in methods:
+                    rejection = await sync_to_async(check, thread_sensitive=False)(request, scope, keys)
+                    if rejection is not None:
+                        return rejection
+                return await view(request, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                rejection = check(request, scope, keys)
+                if rejection is not None:
+                    return rejection
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RateLimitMiddleware:
+    """
+    Site-wide per-IP budget for unsafe requests. Placed before the session
+    and auth middleware so floods are shed before they reach the database.
+    Async-capable, so it doesn't force the ASGI chain through a thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            rejection = check(request, "global", ("ip",))
+            if rejection is not None:
+                return rejection
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method not in ("GET", "HEAD", "OPTIONS"):
+            rejection = await sync_to_async(check, thread_sensitive=False)(request, "global", ("ip",))
+            if rejection is not None:
+                return rejection
+        return await self.get_response(request)
@@ -0,0 +1,52 @@
+import asyncio
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+_client = None
+_async_clients = {}  # event loop -> client
+
+
+def _options():
+    return {
+        "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
+        "health_check_interval": 30,
+    }
+
+
+def get_redis():
+    """
+    Shared Redis client for application data (not the Celery broker).
+
+    redis-py's connection pool checks the PID on every checkout, so the
+    client is safe to create before gunicorn or Celery fork.
+    """
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, **_options())
+    return _client
+
+
+def get_async_redis():
+    """
+    asyncio Redis client for async views under ASGI. Connections belong to
+    an event loop, so one client is kept per running loop and the clients of
+    loops that have closed are dropped.
+
+    Under WSGI every async view runs in a new event loop (async_to_sync), so
+    callers use the shared sync client there instead; see ``use_async_redis``.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        for closed in [other for other in _async_clients if other.is_closed()]:
+            del _async_clients[closed]
+        client = _async_clients[loop] = redis.asyncio.Redis.from_url(settings.REDIS_URL, **_options())
+    return client
+
+
+def use_async_redis():
+    """True when requests share a long-lived event loop (APP_SERVER=asgi)."""
+    return settings.APP_SERVER == "asgi"
@@ -1,9 +1,12 @@
 # DNarai/settings.py
 from pathlib import Path
+import importlib.util
+import ipaddress
 import os
 from dotenv import load_dotenv
 import dj_database_url
 from celery.schedules import crontab
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables
 load_dotenv()
@@ -25,9 +28,11 @@ ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "localhost,127.0.0.1,web").split(",")
 # Custom User Model
 # ------------------------------
 AUTH_USER_MODEL = "accounts.CustomUser"
+# UsernameOrEmailBackend covers username logins and raises PermissionDenied on
+# a failed attempt, which stops the chain, so a backend listed after it would
+# never authenticate anyone.
 AUTHENTICATION_BACKENDS = [
     "accounts.auth_backends.UsernameOrEmailBackend",
-    "django.contrib.auth.backends.ModelBackend",
 ]
 
 # ------------------------------
@@ -55,7 +60,12 @@ INSTALLED_APPS = [
 # Middleware
 # ------------------------------
 MIDDLEWARE = [
+    "DNarai.log.RequestIdMiddleware",
+    "DNarai.metrics.PrometheusMiddleware",
+    "DNarai.profiling.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "DNarai.db_router.ReplicaPinningMiddleware",
+    "DNarai.ratelimit.RateLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -79,6 +89,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.cache_settings",
             ],
         },
     },
@@ -86,16 +97,216 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "DNarai.wsgi.application"
 ASGI_APPLICATION = "DNarai.asgi.application"
+# The server production runs: "wsgi" (gunicorn) or "asgi" (daphne)
+APP_SERVER = os.getenv("APP_SERVER", "wsgi")
 
 # ------------------------------
 # Database
 # ------------------------------
+# DB_POOL_MODE:
+#   none        - a new connection per request/task
+#   persistent  - each process keeps its connection for DB_CONN_MAX_AGE seconds,
+#                 checked before reuse
+#   pool        - psycopg 3 connection pool per process (Django's OPTIONS["pool"])
+#   pgbouncer   - connections to PgBouncer in transaction pooling mode, kept
+#                 for DB_CONN_MAX_AGE seconds under WSGI
+# Under ASGI each request runs its queries in a thread of its own, so a
+# persistent connection is never reused and is left open when the thread
+# ends. ASGI therefore defaults to the pool, closes PgBouncer connections
+# after each request and refuses "persistent".
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "pool" if APP_SERVER == "asgi" else "persistent")
+if APP_SERVER == "asgi" and DB_POOL_MODE == "persistent":
+    raise ImproperlyConfigured("DB_POOL_MODE=persistent leaks connections under ASGI; use pool, pgbouncer or none.")
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", 600))  # seconds
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))  # seconds to wait for a free connection
+
+DB_PERSISTENT = DB_POOL_MODE == "persistent" or (DB_POOL_MODE == "pgbouncer" and APP_SERVER != "asgi")
+DB_CONNECTION_OPTIONS = {
+    "conn_max_age": DB_CONN_MAX_AGE if DB_PERSISTENT else 0,
+    "conn_health_checks": DB_POOL_MODE != "none",
+}
 DATABASES = {
     "default": dj_database_url.config(
-        default=f"postgres://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}"
+        default=f"postgres://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}",
+        **DB_CONNECTION_OPTIONS,
     )
 }
 
+# Read replicas (comma-separated URLs) as "replica1", "replica2", ... Only
+# reads that opt in with DNarai.db_router.use_replica() go to them.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+for number, url in enumerate(DATABASE_REPLICA_URLS, start=1):
+    DATABASES[f"replica{number}"] = dj_database_url.parse(url, **DB_CONNECTION_OPTIONS)
+    DATABASES[f"replica{number}"]["TEST"] = {"MIRROR": "default"}
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["DNarai.db_router.ReplicaRouter"] if REPLICA_DATABASES else []
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", 2))
+# After a request writes, the client reads from the primary for this long
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", 15))
+REPLICA_PIN_COOKIE = "db_pin_primary"
+
+for database in DATABASES.values():
+    if database["ENGINE"] != "django.db.backends.postgresql":
+        continue
+    if DB_POOL_MODE == "pool":
+        database.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": DB_POOL_MIN_SIZE,
+            "max_size": DB_POOL_MAX_SIZE,
+            "timeout": DB_POOL_TIMEOUT,
+        }
+    elif DB_POOL_MODE == "pgbouncer":
+        # Transaction pooling can't keep a cursor or prepared statement across transactions
+        database["DISABLE_SERVER_SIDE_CURSORS"] = True
+        if importlib.util.find_spec("psycopg"):
+            database.setdefault("OPTIONS", {})["prepare_threshold"] = None
+
+# ------------------------------
+# Redis (application data)
+# ------------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/1")
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5))  # seconds
+
+# ------------------------------
+# Cache (see DNarai/cache.py)
+# ------------------------------
+# Shared by every process and node. Set CACHE_URL to an empty value to use a
+# per-process LocMem cache instead (e.g. local development without Redis).
+CACHE_URL = os.getenv("CACHE_URL", REDIS_URL)
+CACHE_DEFAULT_TIMEOUT = int(os.getenv("CACHE_DEFAULT_TIMEOUT", 300))  # seconds
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+            "KEY_PREFIX": "dnarai",
+            "TIMEOUT": CACHE_DEFAULT_TIMEOUT,
+            "OPTIONS": {
+                "socket_timeout": REDIS_SOCKET_TIMEOUT,
+                "socket_connect_timeout": REDIS_SOCKET_TIMEOUT,
+                "health_check_interval": 30,
+            },
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "TIMEOUT": CACHE_DEFAULT_TIMEOUT,
+        }
+    }
+# Per-process cache for static template fragments; a Redis round trip would
+# cost more than rendering them.
+CACHES["fragments"] = {
+    "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    "LOCATION": "fragments",
+}
+
+# Anonymous full-page and template-fragment caching; off in development so
+# template edits show up immediately.
+PAGE_CACHE_SECONDS = int(os.getenv("PAGE_CACHE_SECONDS", 0 if DEBUG else 600))
+FRAGMENT_CACHE_SECONDS = int(os.getenv("FRAGMENT_CACHE_SECONDS", 0 if DEBUG else 86400))
+
+# How often each process checks whether session types/durations/formats changed
+LOOKUP_CACHE_CHECK_SECONDS = float(os.getenv("LOOKUP_CACHE_CHECK_SECONDS", 5))
+
+# Admin changelists switch from COUNT(*) to the planner's estimate above this many rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = int(os.getenv("ADMIN_ESTIMATED_COUNT_THRESHOLD", 100000))
+
+# ------------------------------
+# Sessions and logged-in users
+# ------------------------------
+# Sessions live only in Redis, so SESSION_CACHE_URL should point at a Redis
+# that doesn't evict keys under memory pressure. Without one, sessions stay
+# in the database.
+SESSION_CACHE_URL = os.getenv("SESSION_CACHE_URL", CACHE_URL)
+if SESSION_CACHE_URL:
+    CACHES["sessions"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": SESSION_CACHE_URL,
+        "KEY_PREFIX": "dnarai",
+        "OPTIONS": {
+            "socket_timeout": REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": REDIS_SOCKET_TIMEOUT,
+            "health_check_interval": 30,
+        },
+    }
+    SESSION_ENGINE = "django.contrib.sessions.backends.cache"
+    SESSION_CACHE_ALIAS = "sessions"
+SESSION_PURGE_BATCH_SIZE = int(os.getenv("SESSION_PURGE_BATCH_SIZE", 1000))
+# Logged-in users are loaded from the cache (accounts/auth_backends.py). Only
+# with a shared cache: a per-process one can't be invalidated from other
+# processes, so a password change wouldn't end sessions they serve.
+USER_CACHE_SECONDS = int(os.getenv("USER_CACHE_SECONDS", 300)) if CACHE_URL else 0
+
+# ------------------------------
+# Rate limiting (see DNarai/ratelimit.py)
+# ------------------------------
+RATELIMIT_ENABLED = os.getenv("RATELIMIT_ENABLED", "True").lower() in ("true", "1", "yes")
+# Only when every request comes through a proxy that appends to
+# X-Forwarded-For (nginx in docker-compose); otherwise clients choose their IP
+RATELIMIT_TRUST_PROXY_HEADERS = os.getenv("RATELIMIT_TRUST_PROXY_HEADERS", "False").lower() in ("true", "1", "yes")
+# Further proxies in front of that one (e.g. a load balancer), as comma-separated addresses or networks
+RATELIMIT_TRUSTED_PROXIES = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in os.getenv("RATELIMIT_TRUSTED_PROXIES", "").split(",")
+    if network.strip()
+]
+RATELIMIT_RATES = {
+    # "<scope>:<key>": "<requests>/<period>"
+    "global:ip": os.getenv("RATELIMIT_GLOBAL_IP", "120/m"),
+    "login:ip": os.getenv("RATELIMIT_LOGIN_IP", "20/m"),
+    "login:account": os.getenv("RATELIMIT_LOGIN_ACCOUNT", "5/m"),
+    "signup:ip": os.getenv("RATELIMIT_SIGNUP_IP", "5/10m"),
+    "password_reset:ip": os.getenv("RATELIMIT_PASSWORD_RESET_IP", "5/h"),
+    "password_reset:email": os.getenv("RATELIMIT_PASSWORD_RESET_EMAIL", "3/h"),
+    "contact:ip": os.getenv("RATELIMIT_CONTACT_IP", "5/m"),
+    "contact:email": os.getenv("RATELIMIT_CONTACT_EMAIL", "3/10m"),
+}
+
+# ------------------------------
+# Metrics (see DNarai/metrics.py)
+# ------------------------------
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; staff can also view /metrics.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_CELERY_QUEUES = os.getenv("METRICS_CELERY_QUEUES", "celery").split(",")
+
+# ------------------------------
+# Request and task profiling (see DNarai/profiling.py, DNarai/celery.py)
+# ------------------------------
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "False").lower() in ("true", "1", "yes")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0.01))  # fraction of requests
+PROFILING_PATHS = [p for p in os.getenv("PROFILING_PATHS", "").split(",") if p]  # prefixes; empty = all
+PROFILING_EXCLUDE_PATHS = [p for p in os.getenv("PROFILING_EXCLUDE_PATHS", "/static/,/media/,/metrics").split(",") if p]
+PROFILING_SLOWEST_QUERIES = int(os.getenv("PROFILING_SLOWEST_QUERIES", 3))
+
+# Celery tasks: slower ones are logged with their query/template/SMTP breakdown,
+# and a sampled fraction is run under cProfile with stats dumped to TASK_PROFILE_DIR.
+TASK_SLOW_SECONDS = float(os.getenv("TASK_SLOW_SECONDS", 10))
+TASK_PROFILE_SAMPLE_RATE = float(os.getenv("TASK_PROFILE_SAMPLE_RATE", 0))
+TASK_PROFILE_DIR = os.getenv("TASK_PROFILE_DIR", str(BASE_DIR / "logs" / "task-profiles"))
+
+# ------------------------------
+# Signed links
+# ------------------------------
+# Booking and verification links carry a TimestampSigner token instead of a
+# DB-stored token. Links with legacy tokens keep working.
+SIGNED_LINK_TOKENS = os.getenv("SIGNED_LINK_TOKENS", "True").lower() in ("true", "1", "yes")
+BOOKING_LINK_MAX_AGE_HOURS = int(os.getenv("BOOKING_LINK_MAX_AGE_HOURS", 48))
+EMAIL_VERIFICATION_MAX_AGE = int(os.getenv("EMAIL_VERIFICATION_MAX_AGE", 15 * 60))  # seconds
+VERIFICATION_TOKEN_PURGE_BATCH_SIZE = int(os.getenv("VERIFICATION_TOKEN_PURGE_BATCH_SIZE", 1000))
+
+# ------------------------------
+# Username availability index
+# ------------------------------
+USERNAME_INDEX_MODE = os.getenv("USERNAME_INDEX_MODE", "set")  # set / bloom
+USERNAME_BLOOM_BITS = int(os.getenv("USERNAME_BLOOM_BITS", 2 ** 24))
+USERNAME_BLOOM_HASHES = int(os.getenv("USERNAME_BLOOM_HASHES", 7))
+USERNAME_PROBE_CACHE_SECONDS = int(os.getenv("USERNAME_PROBE_CACHE_SECONDS", 30))
+USERNAME_CHECK_MAX_AGE = int(os.getenv("USERNAME_CHECK_MAX_AGE", 10))  # Cache-Control max-age
+
 # ------------------------------
 # Password validation
 # ------------------------------
@@ -138,6 +349,12 @@ DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "DNarai <no-reply@dnarai.co
 DEFAULT_MENTOR_EMAIL = os.getenv("DEFAULT_MENTOR_EMAIL", "admin@example.com")
 BASE_URL = os.getenv("BASE_URL", "http://127.0.0.1:8000")
 
+# Pooled connections kept open by Celery workers (see core/email_pool.py)
+EMAIL_POOL_MAX_CONNECTIONS = int(os.getenv("EMAIL_POOL_MAX_CONNECTIONS", 2))
+EMAIL_POOL_IDLE_TIMEOUT = int(os.getenv("EMAIL_POOL_IDLE_TIMEOUT", 120))  # seconds
+EMAIL_POOL_HEALTHCHECK_INTERVAL = int(os.getenv("EMAIL_POOL_HEALTHCHECK_INTERVAL", 15))  # seconds
+EMAIL_POOL_TIMEOUT = int(os.getenv("EMAIL_POOL_TIMEOUT", 30))  # seconds
+
 # ------------------------------
 # Celery
 # ------------------------------
@@ -147,12 +364,47 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TASK_TRACK_STARTED = True
+# Tasks with ignore_result=True (the email tasks) still record failures
+CELERY_TASK_STORE_ERRORS_EVEN_IF_IGNORED = True
+# Stored results are pruned in batches by DNarai.tasks.prune_task_results
+# instead of Celery's single-statement celery.backend_cleanup
+CELERY_RESULT_EXPIRES = None
+TASK_RESULT_RETENTION_DAYS = int(os.getenv("TASK_RESULT_RETENTION_DAYS", 7))
+TASK_RESULT_PRUNE_BATCH_SIZE = int(os.getenv("TASK_RESULT_PRUNE_BATCH_SIZE", 1000))
+TASK_RESULT_PRUNE_MAX_BATCHES = int(os.getenv("TASK_RESULT_PRUNE_MAX_BATCHES", 100))
 CELERY_TASK_TIME_LIMIT = 30 * 60
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", 500))
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", 200))
+EMAIL_OUTBOX_MAX_BATCHES = int(os.getenv("EMAIL_OUTBOX_MAX_BATCHES", 50))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", 5))
+EMAIL_OUTBOX_DISPATCH_INTERVAL = float(os.getenv("EMAIL_OUTBOX_DISPATCH_INTERVAL", 10))  # seconds
+COMPLETION_PROMPT_BATCH_SIZE = int(os.getenv("COMPLETION_PROMPT_BATCH_SIZE", 200))
+COMPLETION_PROMPT_MAX_BATCHES = int(os.getenv("COMPLETION_PROMPT_MAX_BATCHES", 50))
 CELERY_BEAT_SCHEDULE = {
     "send-session-reminders-every-hour": {
         "task": "DNarai.tasks.send_pending_session_reminders",
         "schedule": crontab(minute=0),  # every hour
     },
+    "purge-email-verification-tokens-daily": {
+        "task": "DNarai.tasks.purge_email_verification_tokens",
+        "schedule": crontab(minute=30, hour=3),
+    },
+    "dispatch-email-outbox": {
+        "task": "DNarai.tasks.dispatch_email_outbox",
+        "schedule": EMAIL_OUTBOX_DISPATCH_INTERVAL,
+    },
+    "send-due-completion-prompts": {
+        "task": "DNarai.tasks.send_due_completion_prompts",
+        "schedule": crontab(minute="*/5"),
+    },
+    "purge-db-sessions-daily": {
+        "task": "DNarai.tasks.purge_db_sessions",
+        "schedule": crontab(minute=45, hour=3),
+    },
+    "prune-task-results": {
+        "task": "DNarai.tasks.prune_task_results",
+        "schedule": crontab(minute=15),  # every hour
+    },
 }
 
 # ------------------------------
@@ -160,24 +412,43 @@ CELERY_BEAT_SCHEDULE = {
 # ------------------------------
 LOG_DIR = BASE_DIR / "logs"
 LOG_DIR.mkdir(exist_ok=True)
+# Records are queued and written by a background thread (DNarai/log.py)
+LOG_STRUCTURED = os.getenv("LOG_STRUCTURED", "True").lower() in ("true", "1", "yes")  # JSON lines
+# external: logrotate moves the file (see logrotate.conf) and each process
+# reopens it. size / time rotate from inside the process, which is only safe
+# when a single process writes the file: with several gunicorn workers or
+# Celery children, each one renames the file on its own schedule and the
+# others keep writing to the renamed file or truncate a fresh one.
+LOG_ROTATION = os.getenv("LOG_ROTATION", "external")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 20 * 1024 * 1024))  # with LOG_ROTATION=size
+LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")  # with LOG_ROTATION=time
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 10))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # records; more are dropped
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
-    "formatters": {
-        "verbose": {"format": "{levelname} {asctime} {name} {message}", "style": "{"},
+    "filters": {
+        "context": {"()": "DNarai.log.ContextFilter"},
     },
     "handlers": {
-        "file": {
+        "queued": {
+            "()": "DNarai.log.QueuedHandler",
             "level": "INFO",
-            "class": "logging.FileHandler",
+            "filters": ["context"],
             "filename": LOG_DIR / "mentorship_app.log",
-            "formatter": "verbose",
+            "rotation": LOG_ROTATION,
+            "max_bytes": LOG_MAX_BYTES,
+            "when": LOG_ROTATE_WHEN,
+            "backup_count": LOG_BACKUP_COUNT,
+            "structured": LOG_STRUCTURED,
+            "queue_size": LOG_QUEUE_SIZE,
         },
-        "console": {"class": "logging.StreamHandler"},
     },
     "loggers": {
-        "django": {"handlers": ["file", "console"], "level": "INFO", "propagate": True},
-        "core": {"handlers": ["file", "console"], "level": "INFO", "propagate": False},
+        "django": {"handlers": ["queued"], "level": "INFO", "propagate": False},
+        "core": {"handlers": ["queued"], "level": "INFO", "propagate": False},
+        "accounts": {"handlers": ["queued"], "level": "INFO", "propagate": False},
+        "DNarai": {"handlers": ["queued"], "level": "INFO", "propagate": False},
     },
 }
 
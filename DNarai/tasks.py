@@ -1,107 +1,502 @@
 import logging
+import time
 from celery import shared_task
+from django_celery_results.models import GroupResult, TaskResult
+from django.contrib.sessions.models import Session
 from django.core.mail import EmailMultiAlternatives
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.template.loader import render_to_string
 from django.utils import timezone
+from django.utils.html import strip_tags
 from datetime import timedelta
-from core.models import LeadershipSessionBooking
+from accounts.models import EmailVerificationToken
+from core.email_pool import email_pool
+from core.emails import render_email, resolve_contexts, serialize_context
+from core.models import EmailOutbox, LeadershipSessionBooking
+from core.tokens import booking_link_token
+from DNarai.db_router import use_replica
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def build_email_message(subject, html_content, recipient_list, from_email=None, text_content=None):
+    """
+    Builds an HTML email with a plain text fallback.
+    """
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+
+    # fallback plain text
+    if not text_content:
+        text_content = "This is an HTML email. Please use a compatible email client."
+
+    msg = EmailMultiAlternatives(subject, text_content, from_email, recipient_list)
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def render_html_bodies(messages):
+    """
+    Returns the HTML body of each message dict, rendering the ones that
+    carry a ``template_name`` and serialized ``context`` instead of
+    ``html_content``. Model references are loaded in bulk.
+    """
+    templated = [m for m in messages if m.get("template_name")]
+    contexts = iter(resolve_contexts([m.get("context") or {} for m in templated]))
+    return [
+        render_email(m["template_name"], next(contexts)) if m.get("template_name") else m["html_content"]
+        for m in messages
+    ]
+
+
+# Result policy: email tasks are fire-and-forget (nobody reads their result,
+# and failures show up in the logs, metrics and EmailOutbox), so they don't
+# write a TaskResult row. The periodic sweeps below keep theirs, since their
+# summaries are what gets checked in the admin.
+
+# Bodies that still travel through the broker are compressed.
+@shared_task(bind=True, max_retries=3, default_retry_delay=60, compression="zlib", ignore_result=True)
 def send_email_task(self, subject, html_content, recipient_list, from_email=None, text_content=None):
     """
     Generic email sending task.
     """
     try:
-        from_email = from_email or settings.DEFAULT_FROM_EMAIL
+        msg = build_email_message(subject, html_content, recipient_list, from_email, text_content)
+        failed = email_pool.send_messages([msg])
+        if failed:
+            raise failed[0][1]
+
+        logger.info("[Email Task] Sent '%s' to %s", subject, recipient_list)
+
+    except Exception as e:
+        logger.exception("[Email Task] Failed to send '%s' to %s, retrying...", subject, recipient_list)
+        raise self.retry(exc=e)
 
-        # fallback plain text
-        if not text_content:
-            text_content = "This is an HTML email. Please use a compatible email client."
 
-        msg = EmailMultiAlternatives(subject, text_content, from_email, recipient_list)
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+@shared_task(bind=True, max_retries=3, default_retry_delay=60, ignore_result=True)
+def send_templated_email_task(self, template_name, subject, recipient_list, context=None, from_email=None):
+    """
+    Renders ``template_name`` on the worker and sends it.
 
-        logger.info(f"[Email Task] Sent '{subject}' to {recipient_list}")
+    ``context`` is a serialized context (see ``core.emails.serialize_context``)
+    so the task message only carries IDs and a few small values.
+    """
+    try:
+        html_content = render_html_bodies([{"template_name": template_name, "context": context}])[0]
+        msg = build_email_message(subject, html_content, recipient_list, from_email, strip_tags(html_content))
+        failed = email_pool.send_messages([msg])
+        if failed:
+            raise failed[0][1]
+
+        logger.info("[Email Task] Sent '%s' (%s) to %s", subject, template_name, recipient_list)
 
     except Exception as e:
-        logger.exception(f"[Email Task] Failed to send '{subject}' to {recipient_list}, retrying...")
+        logger.exception("[Email Task] Failed to send '%s' to %s, retrying...", subject, recipient_list)
         raise self.retry(exc=e)
 
 
-@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+@shared_task(bind=True, max_retries=3, default_retry_delay=60, compression="zlib", ignore_result=True)
+def send_email_batch_task(self, messages):
+    """
+    Sends a batch of emails over a single pooled SMTP connection.
+
+    Each item in ``messages`` is a dict with the same keys as the arguments
+    of ``send_email_task``, or of ``send_templated_email_task`` for messages
+    rendered on the worker. Only the messages that failed are retried.
+    """
+    emails = [
+        build_email_message(
+            message["subject"],
+            html_content,
+            message["recipient_list"],
+            message.get("from_email"),
+            message.get("text_content"),
+        )
+        for message, html_content in zip(messages, render_html_bodies(messages))
+    ]
+    failed = email_pool.send_messages(emails)
+
+    logger.info("[Email Batch] Sent %d/%d messages", len(messages) - len(failed), len(messages))
+
+    if failed:
+        for msg, e in failed:
+            logger.warning("[Email Batch] Failed to send '%s' to %s: %s", msg.subject, msg.to, e)
+        failed_ids = {id(msg) for msg, _ in failed}
+        raise self.retry(
+            args=([message for message, msg in zip(messages, emails) if id(msg) in failed_ids],),
+            exc=failed[-1][1],
+        )
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60, ignore_result=True)
 def send_session_completion_email(self, booking_id):
     """
     Sends a session completion prompt email to the user for a LeadershipSessionBooking.
+
+    Only ETA tasks published by earlier releases still call this; new prompts
+    are sent by ``send_due_completion_prompts``. The booking is claimed first
+    so the two never both send.
     """
+    claimed = LeadershipSessionBooking.objects.filter(
+        id=booking_id, completion_prompt_sent_at__isnull=True
+    ).update(completion_prompt_sent_at=timezone.now())
+    if not claimed:
+        logger.info("[Completion Email] Booking %s already prompted or missing, skipping", booking_id)
+        return
+
     try:
         booking = LeadershipSessionBooking.objects.get(id=booking_id)
 
         if not booking.email:
-            logger.warning(f"[Completion Email] Booking {booking_id} has no email address.")
+            logger.warning("[Completion Email] Booking %s has no email address.", booking_id)
             return
 
         subject = "Please Confirm Your Session Completion"
         from_email = settings.DEFAULT_FROM_EMAIL
         to_email = booking.email
 
+        completion_link = f"{settings.BASE_URL}/complete-session/{booking_link_token(booking, 'complete')}/"
+
         # Render HTML template
         html_content = render_to_string('emails/session_completion_prompt.html', {
             'booking': booking,
-            'completion_link': f"{settings.BASE_URL}/complete-session/{booking.session_completion_token}/"
+            'completion_link': completion_link,
         })
 
         # Plain text fallback
-        text_content = f"Hi {booking.full_name}, please confirm your session here: {settings.BASE_URL}/complete-session/{booking.session_completion_token}/"
+        text_content = f"Hi {booking.full_name}, please confirm your session here: {completion_link}"
 
-        msg = EmailMultiAlternatives(subject, text_content, from_email, [to_email])
-        msg.attach_alternative(html_content, "text/html")
-        msg.send()
+        msg = build_email_message(subject, html_content, [to_email], from_email, text_content)
+        failed = email_pool.send_messages([msg])
+        if failed:
+            raise failed[0][1]
 
-        logger.info(f"[Completion Email] Sent to {to_email} for booking ID {booking_id}")
+        logger.info("[Completion Email] Sent to %s for booking ID %s", to_email, booking_id)
 
     except ObjectDoesNotExist:
-        logger.error(f"[Completion Email] Booking with ID {booking_id} not found.")
+        logger.error("[Completion Email] Booking with ID %s not found.", booking_id)
     except Exception as e:
-        logger.exception(f"[Completion Email] Error sending for booking {booking_id}, retrying...")
+        logger.exception("[Completion Email] Error sending for booking %s, retrying...", booking_id)
+        # Release the claim so the retry (or the sweeper) can send it
+        LeadershipSessionBooking.objects.filter(id=booking_id).update(completion_prompt_sent_at=None)
         raise self.retry(exc=e)
 
 
+def due_completion_prompt_queryset(now):
+    """
+    Bookings whose session has ended and that haven't been prompted to
+    confirm completion. Served by core_booking_prompt_due_idx.
+    """
+    return LeadershipSessionBooking.objects.filter(
+        session_end_at__lte=now,
+        completion_prompt_sent_at__isnull=True,
+        is_session_completed=False,
+    ).order_by("session_end_at", "id")
+
+
 @shared_task
-def send_pending_session_reminders():
+def send_due_completion_prompts(batch_size=None, max_batches=None):
     """
-    Find bookings needing a reminder and send emails.
+    Queues completion prompts for every booking whose session has ended.
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, written to
+    the email outbox and marked as prompted in the same transaction, so a
+    prompt is queued exactly once however often this runs. The cost depends
+    only on how many sessions ended since the last run, not on how far ahead
+    bookings are made.
+    """
+    batch_size = batch_size or settings.COMPLETION_PROMPT_BATCH_SIZE
+    max_batches = max_batches or settings.COMPLETION_PROMPT_MAX_BATCHES
+    queued = 0
+
+    for _ in range(max_batches):
+        now = timezone.now()
+        with transaction.atomic():
+            bookings = list(
+                due_completion_prompt_queryset(now)
+                .select_for_update(skip_locked=True)
+                .only("id", "full_name", "email", "session_completion_token")[:batch_size]
+            )
+            if not bookings:
+                break
+
+            rows = []
+            for booking in bookings:
+                completion_link = f"{settings.BASE_URL}/complete-session/{booking_link_token(booking, 'complete')}/"
+                rows.append(EmailOutbox(
+                    subject="Please Confirm Your Session Completion",
+                    template_name="emails/session_completion_prompt.html",
+                    context=serialize_context({"booking": booking, "completion_link": completion_link}),
+                    text_content=f"Hi {booking.full_name}, please confirm your session here: {completion_link}",
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipient_list=[booking.email],
+                ))
+                booking.completion_prompt_sent_at = now
+            EmailOutbox.objects.bulk_create(rows)
+            LeadershipSessionBooking.objects.bulk_update(bookings, ["completion_prompt_sent_at"])
+        queued += len(bookings)
+
+    if queued:
+        logger.info("[Completion Prompts] Queued %d prompts", queued)
+    return {"queued": queued}
+
+
+def pending_reminder_queryset(now):
+    """
+    Bookings starting within 24 hours that are still unconfirmed and haven't
+    been reminded in the last 6 hours. Served by core_booking_reminder_idx.
     """
-    now = timezone.now()
     reminder_window = now + timedelta(hours=24)
     recent_reminder_cutoff = now - timedelta(hours=6)
 
-    # Find bookings that need a reminder
-    bookings = LeadershipSessionBooking.objects.filter(
+    return LeadershipSessionBooking.objects.filter(
         preferred_datetime__gte=now,
         preferred_datetime__lte=reminder_window,
         is_mentor_confirmed=False,
         is_session_completed=False
     ).exclude(
         last_reminder_sent_at__gte=recent_reminder_cutoff
-    )
+    ).order_by("preferred_datetime", "id")
 
-    for booking in bookings:
-        html_content = render_to_string(
-            "emails/session_reminder.html",
-            {"booking": booking}
-        )
-        send_email_task.delay(
-            "Session Reminder: Please Confirm Your Attendance",
-            html_content,
-            [booking.email],
-            settings.DEFAULT_FROM_EMAIL
+
+@shared_task
+def send_pending_session_reminders(chunk_size=None):
+    """
+    Find bookings needing a reminder and send emails.
+
+    Candidates are streamed in chunks; each chunk is enqueued as a single
+    batch email task (rendered by the worker that sends it) and its
+    ``last_reminder_sent_at`` is written with one bulk update.
+    """
+    chunk_size = chunk_size or settings.REMINDER_BATCH_SIZE
+    now = timezone.now()
+    bookings = pending_reminder_queryset(now).only("id", "email")
+
+    chunk = []
+    chunks_sent = 0
+    total_sent = 0
+
+    def flush(chunk):
+        started = time.perf_counter()
+        messages = [
+            {
+                "subject": "Session Reminder: Please Confirm Your Attendance",
+                "template_name": "emails/session_reminder.html",
+                "context": serialize_context({"booking": booking}),
+                "recipient_list": [booking.email],
+                "from_email": settings.DEFAULT_FROM_EMAIL,
+            }
+            for booking in chunk
+        ]
+        built = time.perf_counter()
+
+        send_email_batch_task.delay(messages)
+        enqueued = time.perf_counter()
+
+        for booking in chunk:
+            booking.last_reminder_sent_at = now
+        LeadershipSessionBooking.objects.bulk_update(chunk, ["last_reminder_sent_at"])
+        updated = time.perf_counter()
+
+        logger.info(
+            "[Reminders] Chunk of %d: build %.1fms, enqueue %.1fms, update %.1fms",
+            len(chunk),
+            (built - started) * 1000,
+            (enqueued - built) * 1000,
+            (updated - enqueued) * 1000,
         )
-        # Update last_reminder_sent_at
-        booking.last_reminder_sent_at = now
-        booking.save(update_fields=["last_reminder_sent_at"])
+
+    started = time.perf_counter()
+    # The scan may lag the primary by REPLICA_MAX_LAG_SECONDS, far less than
+    # the 6 hour re-reminder window; the updates go to the primary.
+    with use_replica():
+        for booking in bookings.iterator(chunk_size=chunk_size):
+            chunk.append(booking)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunks_sent += 1
+                total_sent += len(chunk)
+                chunk = []
+
+    if chunk:
+        flush(chunk)
+        chunks_sent += 1
+        total_sent += len(chunk)
+
+    logger.info(
+        "[Reminders] Queued %d reminders in %d chunks (%.1fms)",
+        total_sent,
+        chunks_sent,
+        (time.perf_counter() - started) * 1000,
+    )
+    return {"reminders": total_sent, "chunks": chunks_sent}
+
+
+# Runs every EMAIL_OUTBOX_DISPATCH_INTERVAL seconds; its counts are logged instead
+@shared_task(ignore_result=True)
+def dispatch_email_outbox(batch_size=None, max_batches=None):
+    """
+    Sends pending EmailOutbox rows in batches.
+
+    Each batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several
+    dispatchers can run side by side, and is sent over one pooled connection.
+    Rows that fail to render or send keep their error in ``last_error`` and
+    are retried with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS is
+    reached, without holding up the rest of their batch.
+    """
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    max_batches = max_batches or settings.EMAIL_OUTBOX_MAX_BATCHES
+    sent = failed = 0
+
+    for _ in range(max_batches):
+        with transaction.atomic():
+            rows = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+                .order_by("next_attempt_at")[:batch_size]
+            )
+            if not rows:
+                break
+
+            # A row that can't be rendered or sent is recorded and retried
+            # later; it must not roll back the rest of the batch.
+            errors = {}
+            try:
+                contexts = resolve_contexts([row.context if row.template_name else {} for row in rows])
+            except Exception:
+                # Resolve them one at a time so only the bad reference fails
+                contexts = [None] * len(rows)
+
+            emails = {}
+            for row, context in zip(rows, contexts):
+                try:
+                    if row.template_name:
+                        if context is None:
+                            context = resolve_contexts([row.context])[0]
+                        html_content = render_email(row.template_name, context)
+                    else:
+                        html_content = row.html_content
+                    emails[row.id] = build_email_message(
+                        row.subject,
+                        html_content,
+                        row.recipient_list,
+                        row.from_email,
+                        row.text_content,
+                    )
+                except Exception as e:
+                    logger.exception("[Outbox] Could not render email %s", row.id)
+                    errors[row.id] = e
+
+            try:
+                failures = {id(msg): e for msg, e in email_pool.send_messages(list(emails.values()))}
+            except Exception as e:
+                logger.exception("[Outbox] Could not send a batch of %d emails", len(emails))
+                failures = {id(msg): e for msg in emails.values()}
+            for row_id, msg in emails.items():
+                if id(msg) in failures:
+                    errors[row_id] = failures[id(msg)]
+
+            now = timezone.now()
+            for row in rows:
+                row.attempts += 1
+                error = errors.get(row.id)
+                if error is None:
+                    row.status = EmailOutbox.STATUS_SENT
+                    row.sent_at = now
+                    row.last_error = ""
+                    sent += 1
+                    continue
+
+                row.last_error = f"{type(error).__name__}: {error}"[:1000]
+                if row.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+                    row.status = EmailOutbox.STATUS_FAILED
+                    failed += 1
+                    logger.error("[Outbox] Giving up on email %s after %d attempts: %s", row.id, row.attempts, error)
+                else:
+                    row.next_attempt_at = now + timedelta(seconds=60 * 2 ** (row.attempts - 1))
+
+            EmailOutbox.objects.bulk_update(
+                rows, ["status", "attempts", "last_error", "next_attempt_at", "sent_at"]
+            )
+
+        if len(rows) < batch_size:
+            break
+
+    if sent or failed:
+        logger.info("[Outbox] Dispatched %d emails, %d failed permanently", sent, failed)
+    return {"sent": sent, "failed": failed}
+
+
+@shared_task
+def purge_email_verification_tokens(batch_size=None):
+    """
+    Deletes used or expired EmailVerificationToken rows in batches so the
+    table doesn't grow without bound.
+    """
+    batch_size = batch_size or settings.VERIFICATION_TOKEN_PURGE_BATCH_SIZE
+    cutoff = timezone.now() - EmailVerificationToken.EXPIRY
+    stale = EmailVerificationToken.objects.filter(Q(is_used=True) | Q(created_at__lt=cutoff))
+
+    deleted = 0
+    while True:
+        ids = list(stale.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += EmailVerificationToken.objects.filter(pk__in=ids).delete()[0]
+
+    logger.info("[Verification Tokens] Purged %d used or expired tokens", deleted)
+    return {"deleted": deleted}
+
+
+@shared_task
+def purge_db_sessions(batch_size=None):
+    """
+    Deletes rows from the database session table in batches: every row once
+    sessions live in the cache (they can no longer be read), otherwise just
+    the expired ones, as ``clearsessions`` would.
+    """
+    batch_size = batch_size or settings.SESSION_PURGE_BATCH_SIZE
+    stale = Session.objects.all()
+    if settings.SESSION_ENGINE == "django.contrib.sessions.backends.db":
+        stale = stale.filter(expire_date__lt=timezone.now())
+
+    deleted = 0
+    while True:
+        keys = list(stale.values_list("pk", flat=True)[:batch_size])
+        if not keys:
+            break
+        deleted += Session.objects.filter(pk__in=keys).delete()[0]
+
+    logger.info("[Sessions] Purged %d database sessions", deleted)
+    return {"deleted": deleted}
+
+
+@shared_task
+def prune_task_results(batch_size=None, max_batches=None):
+    """
+    Deletes stored task results older than TASK_RESULT_RETENTION_DAYS.
+
+    Replaces Celery's own ``celery.backend_cleanup`` (disabled by
+    ``CELERY_RESULT_EXPIRES = None``), which deletes everything expired in
+    one statement. Here each batch walks the ``date_done`` index, oldest
+    first, and commits on its own, so row locks and WAL are spread out and
+    booking writes aren't held up. Stops after ``max_batches``; the next
+    run continues.
+    """
+    batch_size = batch_size or settings.TASK_RESULT_PRUNE_BATCH_SIZE
+    max_batches = max_batches or settings.TASK_RESULT_PRUNE_MAX_BATCHES
+    cutoff = timezone.now() - timedelta(days=settings.TASK_RESULT_RETENTION_DAYS)
+
+    deleted = 0
+    for model in (TaskResult, GroupResult):
+        expired = model.objects.filter(date_done__lt=cutoff).order_by("date_done")
+        for _ in range(max_batches):
+            ids = list(expired.values_list("pk", flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += model.objects.filter(pk__in=ids).delete()[0]
+
+    logger.info("[Task Results] Pruned %d results older than %d days", deleted, settings.TASK_RESULT_RETENTION_DAYS)
+    return {"deleted": deleted}
@@ -3,10 +3,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from DNarai.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include("core.urls")),
     path('accounts/', include('accounts.urls')),
+    path('metrics', metrics_view, name='metrics'),
     
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
@@ -1,8 +1,59 @@
+import logging
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
 from django.db.models import Q
+from django.db.models.functions import Lower
+
+from DNarai.cache import make_key
 from .models import CustomUser
 
+logger = logging.getLogger(__name__)
+
+# Bump with DNarai.cache.invalidate() to drop every cached user, e.g. after
+# adding a field to CustomUser.
+USER_NAMESPACE = "users"
+
+
+def _user_key(user_id):
+    return make_key(USER_NAMESPACE, user_id)
+
+
+def forget_cached_user(user_id):
+    """Drops a user's cached copy once the current transaction commits."""
+    forget_cached_users([user_id])
+
+
+def forget_cached_users(user_ids):
+    """Drops several users' cached copies once the current transaction commits."""
+    user_ids = list(user_ids)
+    if not user_ids or not settings.USER_CACHE_SECONDS:
+        return
+
+    def forget():
+        try:
+            cache.delete_many([_user_key(user_id) for user_id in user_ids])
+        except redis.RedisError:
+            logger.warning("[Users] Could not drop cached users %s", user_ids, exc_info=True)
+    transaction.on_commit(forget)
+
 class UsernameOrEmailBackend(ModelBackend):
+    """
+    Authenticates against a username or an email address.
+
+    The user is resolved with one query (the email match uses the
+    ``lower(email)`` index) and the password is hashed exactly once per
+    attempt: unknown users get a dummy hash of the same cost, and a failed
+    attempt raises PermissionDenied, which stops the backend chain (so this
+    is the only password backend in AUTHENTICATION_BACKENDS). An email
+    shared by several accounts in different cases matches none of them.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
         if username is None:
             username = kwargs.get(CustomUser.USERNAME_FIELD)
@@ -11,21 +62,74 @@ class UsernameOrEmailBackend(ModelBackend):
             return None
 
         # Normalize input
-        username = username.strip().lower()
+        identifier = username.strip()
+        normalized = identifier.lower()
+
+        candidates = list(
+            CustomUser.objects.alias(email_lower=Lower("email"))
+            .filter(Q(username=identifier) | Q(username=normalized) | Q(email_lower=normalized))
+            .order_by("pk")[:3]
+        )
+        # Prefer an exact username match, then the lowercased username, then email
+        user = next(
+            (
+                candidate
+                for match in (identifier, normalized)
+                for candidate in candidates
+                if candidate.username == match
+            ),
+            None,
+        )
+        if user is None and len(candidates) == 1:
+            user = candidates[0]
+
+        if user is None:
+            # Unknown, or an email shared by several accounts in different
+            # cases. Run the default password hasher once to reduce the
+            # timing difference between an existing and a nonexistent user.
+            if len(candidates) > 1:
+                logger.warning("[Auth] Email %r matches %d accounts; refusing the login", normalized, len(candidates))
+            CustomUser().set_password(password)
+            raise PermissionDenied
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        raise PermissionDenied
+
+    def get_user(self, user_id):
+        """
+        Loads the logged-in user for AuthenticationMiddleware from the cache,
+        falling back to the database. Cached copies are dropped whenever the
+        user is saved or deleted (see accounts/signals.py) or updated through
+        ``CustomUser.objects...update()``, so a password change still
+        invalidates other sessions through the session auth hash. Raw SQL
+        writes to the user table aren't seen; a changed user may stay logged
+        in for up to USER_CACHE_SECONDS after one.
+
+        The cached copy includes the password hash, which the session auth
+        hash check needs, so the cache must be as private as the database.
+        With a per-process cache (no CACHE_URL) invalidation can't reach
+        other workers, so USER_CACHE_SECONDS is 0 and users aren't cached.
+        """
+        if not settings.USER_CACHE_SECONDS:
+            return super().get_user(user_id)
 
         try:
-            user = CustomUser.objects.get(
-                Q(username=username) | Q(email__iexact=username)
-            )
-        except CustomUser.DoesNotExist:
-            return None
-        except CustomUser.MultipleObjectsReturned:
-            # Prefer username match over email match
-            try:
-                user = CustomUser.objects.get(username=username)
-            except CustomUser.DoesNotExist:
+            key = _user_key(user_id)
+            user = cache.get(key)
+        except redis.RedisError:
+            logger.warning("[Users] Cache unavailable, loading user from the database", exc_info=True)
+            return super().get_user(user_id)
+
+        if user is None:
+            user = super().get_user(user_id)
+            if user is None:
                 return None
+            try:
+                cache.set(key, user, timeout=settings.USER_CACHE_SECONDS)
+            except redis.RedisError:
+                logger.warning("[Users] Could not cache user %s", user_id, exc_info=True)
+        return user if self.user_can_authenticate(user) else None
 
-        if user.check_password(password) and user.is_active:
-            return user
-        return None
+    async def aget_user(self, user_id):
+        return await sync_to_async(self.get_user)(user_id)
@@ -0,0 +1,90 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import CustomUser
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_login(username_or_email, password):
+    """The login_view flow before the unified backend, for comparison."""
+
+    def legacy_backend(username):
+        username = username.strip().lower()
+        try:
+            user = CustomUser.objects.get(Q(username=username) | Q(email__iexact=username))
+        except CustomUser.DoesNotExist:
+            return None
+        except CustomUser.MultipleObjectsReturned:
+            try:
+                user = CustomUser.objects.get(username=username)
+            except CustomUser.DoesNotExist:
+                return None
+        if user.check_password(password) and user.is_active:
+            return user
+        return None
+
+    def legacy_authenticate(username):
+        return legacy_backend(username) or ModelBackend().authenticate(None, username=username, password=password)
+
+    user = legacy_authenticate(username_or_email)
+    if not user:
+        user_obj = CustomUser.objects.filter(email=username_or_email).first()
+        if user_obj:
+            user = legacy_authenticate(user_obj.username)
+    return user
+
+
+class Command(BaseCommand):
+    help = "Counts password hashes, queries and time per login attempt, before and after the unified backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options["iterations"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, iterations):
+        CustomUser.objects.create_user(
+            username="benchuser", email="bench.user@example.com", password="correct-horse", is_active=True
+        )
+        scenarios = [
+            ("username, good password", "benchuser", "correct-horse"),
+            ("email, good password", "bench.user@example.com", "correct-horse"),
+            ("email, bad password", "bench.user@example.com", "wrong"),
+            ("unknown user", "nobody@example.com", "wrong"),
+        ]
+        flows = [
+            ("before", legacy_login),
+            ("after", lambda username, password: authenticate(None, username=username, password=password)),
+        ]
+
+        hasher_class = type(get_hasher())
+        self.stdout.write(f"{'scenario':<26}{'flow':<8}{'hashes':>8}{'queries':>9}{'ms/attempt':>12}")
+        for label, username, password in scenarios:
+            for flow_name, flow in flows:
+                with mock.patch.object(hasher_class, "encode", autospec=True, side_effect=hasher_class.encode) as encode:
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        for _ in range(iterations):
+                            flow(username, password)
+                        elapsed_ms = (time.perf_counter() - started) * 1000 / iterations
+                self.stdout.write(
+                    f"{label:<26}{flow_name:<8}{encode.call_count / iterations:>8.1f}"
+                    f"{len(queries) / iterations:>9.1f}{elapsed_ms:>12.1f}"
+                )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts import username_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the Redis username availability index from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = username_index.rebuild(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} usernames"))
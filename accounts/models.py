@@ -1,11 +1,35 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 import uuid
 from datetime import timedelta
 
 
-class CustomUserManager(BaseUserManager):
+class CustomUserQuerySet(models.QuerySet):
+    """Drops the cached copies of users changed by bulk updates, which send no signals."""
+
+    def update(self, **kwargs):
+        from .auth_backends import forget_cached_users
+
+        if not settings.USER_CACHE_SECONDS:
+            return super().update(**kwargs)
+        user_ids = list(self.values_list("pk", flat=True))
+        updated = super().update(**kwargs)
+        forget_cached_users(user_ids)
+        return updated
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        from .auth_backends import forget_cached_users
+
+        objs = list(objs)
+        updated = super().bulk_update(objs, fields, batch_size=batch_size)
+        forget_cached_users(obj.pk for obj in objs)
+        return updated
+
+
+class CustomUserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     def create_user(self, username=None, email=None, password=None, **extra_fields):
         """
         Creates and saves a regular user.
@@ -57,15 +81,23 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     objects = CustomUserManager()
 
+    class Meta:
+        indexes = [
+            # Case-insensitive email login (see UsernameOrEmailBackend)
+            models.Index(Lower("email"), name="accounts_user_email_lower_idx"),
+        ]
+
     def __str__(self):
         return self.username or self.email
 
 
 class EmailVerificationToken(models.Model):
+    EXPIRY = timedelta(minutes=15)
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     is_used = models.BooleanField(default=False)
 
     def is_expired(self):
-        return timezone.now() > self.created_at + timedelta(minutes=15)
+        return timezone.now() > self.created_at + self.EXPIRY
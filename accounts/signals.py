@@ -0,0 +1,65 @@
+import logging
+
+import redis
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import username_index
+from .auth_backends import forget_cached_user
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_init, sender=CustomUser)
+def remember_username(sender, instance, **kwargs):
+    instance._indexed_username = instance.username
+
+
+def _update_index(added=None, removed=None):
+    """
+    Updates the username index once the transaction commits, so a rolled
+    back signup doesn't leave its name taken. If the update fails, the index
+    stops being trusted until ``rebuild_username_index`` runs.
+    """
+    def update():
+        try:
+            if removed:
+                username_index.remove(removed)
+            if added:
+                username_index.add(added)
+        except redis.RedisError:
+            logger.warning(
+                "[Username Index] Could not update usernames (added %r, removed %r); using the database until rebuilt",
+                added,
+                removed,
+                exc_info=True,
+            )
+            try:
+                username_index.invalidate()
+            except redis.RedisError:
+                logger.error("[Username Index] Could not invalidate the index", exc_info=True)
+    transaction.on_commit(update)
+
+
+@receiver(post_save, sender=CustomUser)
+def index_username(sender, instance, **kwargs):
+    previous = getattr(instance, "_indexed_username", None)
+    _update_index(
+        added=instance.username,
+        removed=previous if previous and previous != instance.username else None,
+    )
+    instance._indexed_username = instance.username
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def uncache_user(sender, instance, **kwargs):
+    # Covers password changes too; set_password() is always followed by save()
+    forget_cached_user(instance.pk)
+
+
+@receiver(post_delete, sender=CustomUser)
+def unindex_username(sender, instance, **kwargs):
+    _update_index(removed=instance.username)
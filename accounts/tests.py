@@ -1,3 +1,265 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import redis
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import get_hasher
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from DNarai import redis_client
+from .models import CustomUser
+from . import username_index, views
+from .auth_backends import UsernameOrEmailBackend
+
+
+class CheckUsernameRedisClientTests(TestCase):
+    """Async views mustn't leave a Redis client behind for every request."""
+
+    requests = 50
+
+    def setUp(self):
+        server = fakeredis.FakeServer()
+        patches = [
+            mock.patch.object(redis_client, "_client", fakeredis.FakeRedis(server=server)),
+            mock.patch.object(redis_client, "_async_clients", {}),
+            mock.patch(
+                "redis.asyncio.Redis.from_url",
+                side_effect=lambda *args, **kwargs: fakeredis.FakeAsyncRedis(server=server),
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def check_many(self):
+        for n in range(self.requests):
+            response = self.client.get(reverse("accounts:check_username"), {"username": f"user{n}"})
+            self.assertEqual(response.json(), {"available": True})
+
+    @override_settings(APP_SERVER="wsgi")
+    def test_wsgi_uses_the_sync_client(self):
+        # Each request runs the view in a new event loop
+        self.check_many()
+        self.assertEqual(len(redis_client._async_clients), 0)
+
+    @override_settings(APP_SERVER="asgi")
+    def test_clients_of_closed_loops_are_dropped(self):
+        self.check_many()
+        self.assertLessEqual(len(redis_client._async_clients), 1)
+
+
+class GenerateUniqueUsernameTests(TestCase):
+    def setUp(self):
+        patch = mock.patch.object(redis_client, "_client", fakeredis.FakeRedis())
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def create_users(self, *usernames):
+        for username in usernames:
+            CustomUser.objects.create_user(username=username, email=f"{username}@example.com")
+
+    def test_free_base(self):
+        self.assertEqual(views.generate_unique_username("Ada", "Lovelace"), "adalovelace")
+
+    def test_first_free_suffix(self):
+        self.create_users("adalovelace", "adalovelace1", "adalovelace3")
+        self.assertEqual(views.generate_unique_username("Ada", "Lovelace"), "adalovelace2")
+
+    def test_only_numbered_variants_are_loaded(self):
+        self.create_users("adalovelace", "adalovelace1", "adalovelacex", "adalovelace-smith", "adalovelace2b")
+        with mock.patch("accounts.views.next_free_username", wraps=views.next_free_username) as next_free:
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(views.generate_unique_username("Ada", "Lovelace"), "adalovelace2")
+        self.assertEqual(len(queries), 1)
+        next_free.assert_called_once_with("adalovelace", {"adalovelace", "adalovelace1"})
+
+    def test_empty_slug_gets_a_base(self):
+        self.create_users("bob")
+        self.assertEqual(views.generate_unique_username("", ""), "user")
+        self.create_users("user")
+        self.assertEqual(views.generate_unique_username("李", "雷"), "user1")
+
+
+@override_settings(USERNAME_INDEX_MODE="set", USERNAME_BLOOM_BITS=4096)
+class UsernameIndexTests(TestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        patch = mock.patch.object(redis_client, "_client", self.redis)
+        patch.start()
+        self.addCleanup(patch.stop)
+        username_index.rebuild()
+
+    def indexed(self):
+        return {name.decode() for name in self.redis.smembers(username_index.INDEX_KEY)}
+
+    def create_user(self, username):
+        with self.captureOnCommitCallbacks(execute=True):
+            return CustomUser.objects.create_user(username=username, email=f"{username}@example.com")
+
+    def test_add(self):
+        self.create_user("ada")
+        self.assertEqual(self.indexed(), {"ada"})
+        self.assertTrue(username_index.is_taken("ada"))
+        self.assertFalse(username_index.is_taken("grace"))
+
+    def test_rolled_back_signup_is_not_indexed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                CustomUser.objects.create_user(username="ada", email="ada@example.com")
+                raise RuntimeError
+        self.assertEqual(self.indexed(), set())
+        self.assertFalse(username_index.is_taken("ada"))
+
+    def test_rename(self):
+        user = self.create_user("ada")
+        user.username = "countess"
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(self.indexed(), {"countess"})
+        self.assertFalse(username_index.is_taken("ada"))
+
+    def test_delete(self):
+        user = self.create_user("ada")
+        with self.captureOnCommitCallbacks(execute=True):
+            user.delete()
+        self.assertEqual(self.indexed(), set())
+
+    def test_failed_update_falls_back_to_the_database(self):
+        with mock.patch.object(username_index, "add", side_effect=redis.ConnectionError):
+            with self.assertLogs("accounts.signals", "WARNING"):
+                self.create_user("ada")
+        self.assertFalse(self.redis.exists(username_index.READY_KEY))
+        self.assertTrue(username_index.is_taken("ada"))
+
+        self.assertEqual(username_index.rebuild(), 1)
+        self.assertEqual(self.indexed(), {"ada"})
+        self.assertTrue(self.redis.exists(username_index.READY_KEY))
+
+    def test_rebuild_keeps_names_added_meanwhile(self):
+        CustomUser.objects.create_user(username="ada", email="ada@example.com")  # not indexed
+        normalize = username_index.normalize
+
+        def add_during_rebuild(username):
+            if username == "ada":
+                # A signup committing while the table is being read
+                username_index.add("grace")
+            return normalize(username)
+
+        with mock.patch.object(username_index, "normalize", side_effect=add_during_rebuild):
+            username_index.rebuild()
+        self.assertEqual(self.indexed(), {"ada", "grace"})
+        self.assertFalse(self.redis.exists(f"{username_index.INDEX_KEY}:rebuild"))
+
+    @override_settings(USERNAME_INDEX_MODE="bloom")
+    def test_rebuild_bloom(self):
+        CustomUser.objects.create_user(username="ada", email="ada@example.com")
+        username_index.rebuild()
+        self.assertTrue(username_index.is_taken("ada"))
+        self.assertFalse(username_index.is_taken("grace"))
+
+
+@override_settings(
+    USER_CACHE_SECONDS=300,
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://fakeredis:6379/0",
+            "OPTIONS": {"connection_class": fakeredis.FakeConnection, "server": fakeredis.FakeServer()},
+        },
+        "fragments": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    },
+)
+class UserCacheTests(TestCase):
+    def setUp(self):
+        patch = mock.patch.object(redis_client, "_client", fakeredis.FakeRedis())
+        patch.start()
+        self.addCleanup(patch.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user = CustomUser.objects.create_user(
+                username="ada", email="ada@example.com", password="first password", is_active=True
+            )
+        self.backend = UsernameOrEmailBackend()
+
+    def test_miss_then_hit(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_save_drops_cached_copy(self):
+        self.backend.get_user(self.user.pk)
+        self.user.first_name = "Ada"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name, "Ada")
+
+    def test_bulk_update_drops_cached_copy(self):
+        self.backend.get_user(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_password_change_ends_other_sessions(self):
+        self.client.force_login(self.user)
+        booking = reverse("core:booking")
+        self.assertEqual(self.client.get(booking).status_code, 200)  # user now cached
+
+        self.user.set_password("second password")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertRedirects(self.client.get(booking), f"{reverse('accounts:login')}?next={booking}")
+
+    @override_settings(USER_CACHE_SECONDS=0)
+    def test_not_cached_without_a_shared_cache(self):
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.backend.get_user(self.user.pk)
+
+
+class UsernameOrEmailBackendTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        patch = mock.patch.object(redis_client, "_client", fakeredis.FakeRedis())
+        patch.start()
+        cls.addClassCleanup(patch.stop)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(
+            username="ada", email="ada@example.com", password="correct horse", is_active=True
+        )
+
+    def attempt(self, username, password):
+        """Authenticates and returns ``(user, number of password hashes computed)``."""
+        hasher = type(get_hasher())
+        with mock.patch.object(hasher, "encode", autospec=True, side_effect=hasher.encode) as encode:
+            user = authenticate(None, username=username, password=password)
+        return user, encode.call_count
+
+    def test_one_hash_per_attempt(self):
+        CustomUser.objects.create_user(username="grace", email="grace@example.com", password="x", is_active=False)
+        for username, password, expected in (
+            ("ada", "correct horse", self.user),
+            ("ADA@example.com", "correct horse", self.user),
+            ("ada", "wrong", None),
+            ("nobody", "correct horse", None),
+            ("grace", "x", None),  # inactive
+        ):
+            with self.subTest(username=username, password=password):
+                self.assertEqual(self.attempt(username, password), (expected, 1))
+
+    def test_username_match_wins_over_email(self):
+        other = CustomUser.objects.create_user(
+            username="ada@example.org", email="someone@example.com", password="other", is_active=True
+        )
+        CustomUser.objects.create_user(username="lin", email="Ada@Example.org", password="lin", is_active=True)
+        self.assertEqual(self.attempt("ada@example.org", "other"), (other, 1))
+
+    def test_ambiguous_email_is_refused(self):
+        CustomUser.objects.create_user(username="ada2", email="ADA@example.com", password="correct horse", is_active=True)
+        with self.assertLogs("accounts.auth_backends", "WARNING"):
+            self.assertEqual(self.attempt("ada@EXAMPLE.com", "correct horse"), (None, 1))
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core import signing
+
+VERIFY_EMAIL_SALT = "accounts.verify-email"
+
+
+def make_verification_token(user):
+    """Signs the user ID for the email verification link."""
+    return signing.TimestampSigner(salt=VERIFY_EMAIL_SALT).sign(signing.b62_encode(user.pk))
+
+
+def read_verification_token(token):
+    """
+    Returns the user ID in a signed verification token. Raises
+    ``signing.SignatureExpired`` or ``signing.BadSignature`` without touching
+    the database.
+    """
+    value = signing.TimestampSigner(salt=VERIFY_EMAIL_SALT).unsign(
+        token, max_age=settings.EMAIL_VERIFICATION_MAX_AGE
+    )
+    return signing.b62_decode(value)
@@ -8,6 +8,7 @@ app_name = "accounts"
 urlpatterns = [
     path("signup/", views.signup_view, name="signup"),
     path("verify-email/<uuid:token>/", views.verify_email, name="verify_email"),
+    path("verify-email/<str:token>/", views.verify_email, name="verify_email_signed"),
     path("login/", views.login_view, name="login"),
     path("check-username/", views.check_username, name="check_username"),
     path("logout/", views.logout_view, name="logout"),
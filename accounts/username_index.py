@@ -0,0 +1,187 @@
+import hashlib
+import logging
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from DNarai.redis_client import get_async_redis, get_redis, use_async_redis
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+INDEX_KEY = "accounts:usernames"
+BLOOM_KEY = "accounts:usernames:bloom"
+READY_KEY = "accounts:usernames:ready"
+PROBE_KEY = "accounts:username-probe:{}"
+
+
+def normalize(username):
+    # Case is kept so the index agrees with the unique constraint on username
+    return (username or "").strip()
+
+
+def _bloom_offsets(username):
+    """Bit positions of ``username`` in the Bloom filter (double hashing)."""
+    digest = hashlib.sha256(username.encode()).digest()
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:16], "big") | 1
+    bits = settings.USERNAME_BLOOM_BITS
+    return [(h1 + i * h2) % bits for i in range(settings.USERNAME_BLOOM_HASHES)]
+
+
+def _db_is_taken(username):
+    return CustomUser.objects.filter(username=username).exists()
+
+
+def _queue_lookup(pipe, username, bloom):
+    pipe.exists(READY_KEY)
+    pipe.get(PROBE_KEY.format(username))
+    if bloom:
+        for offset in _bloom_offsets(username):
+            pipe.getbit(BLOOM_KEY, offset)
+    else:
+        pipe.sismember(INDEX_KEY, username)
+
+
+def _answer(results, bloom):
+    """The answer from Redis alone, or None if the database must decide."""
+    ready, probe, *membership = results
+    if ready:
+        if not bloom:
+            return bool(membership[0])
+        if not all(membership):
+            return False
+    if probe is not None:
+        return probe == b"1"
+    return None
+
+
+def is_taken(username):
+    """
+    Answers whether ``username`` is taken, from Redis whenever possible.
+
+    In ``set`` mode the index is authoritative. In ``bloom`` mode a negative
+    answer is authoritative and a positive one is confirmed against the
+    database. Database answers are cached for USERNAME_PROBE_CACHE_SECONDS.
+    If the index hasn't been built or Redis is down, the database is used.
+    """
+    username = normalize(username)
+    bloom = settings.USERNAME_INDEX_MODE == "bloom"
+
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        _queue_lookup(pipe, username, bloom)
+        answer = _answer(pipe.execute(), bloom)
+    except redis.RedisError:
+        logger.warning("[Username Index] Redis unavailable, falling back to the database", exc_info=True)
+        return _db_is_taken(username)
+
+    if answer is not None:
+        return answer
+
+    taken = _db_is_taken(username)
+    try:
+        get_redis().set(PROBE_KEY.format(username), "1" if taken else "0", ex=settings.USERNAME_PROBE_CACHE_SECONDS)
+    except redis.RedisError:
+        pass
+    return taken
+
+
+async def ais_taken(username):
+    """Async version of ``is_taken`` for async views."""
+    if not use_async_redis():
+        return await sync_to_async(is_taken)(username)
+
+    username = normalize(username)
+    bloom = settings.USERNAME_INDEX_MODE == "bloom"
+
+    try:
+        pipe = get_async_redis().pipeline(transaction=False)
+        _queue_lookup(pipe, username, bloom)
+        answer = _answer(await pipe.execute(), bloom)
+    except redis.RedisError:
+        logger.warning("[Username Index] Redis unavailable, falling back to the database", exc_info=True)
+        return await CustomUser.objects.filter(username=username).aexists()
+
+    if answer is not None:
+        return answer
+
+    taken = await CustomUser.objects.filter(username=username).aexists()
+    try:
+        await get_async_redis().set(
+            PROBE_KEY.format(username), "1" if taken else "0", ex=settings.USERNAME_PROBE_CACHE_SECONDS
+        )
+    except redis.RedisError:
+        pass
+    return taken
+
+
+def add(username):
+    username = normalize(username)
+    if not username:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.sadd(INDEX_KEY, username)
+    for offset in _bloom_offsets(username):
+        pipe.setbit(BLOOM_KEY, offset, 1)
+    pipe.delete(PROBE_KEY.format(username))
+    pipe.execute()
+
+
+def remove(username):
+    # Bloom filters can't forget; removed names become false positives that
+    # are confirmed against the database.
+    username = normalize(username)
+    if not username:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    pipe.srem(INDEX_KEY, username)
+    pipe.delete(PROBE_KEY.format(username))
+    pipe.execute()
+
+
+def invalidate():
+    """
+    Stops trusting the index (lookups go to the database) until the next
+    ``rebuild``. Called when an update to it was lost.
+    """
+    get_redis().delete(READY_KEY)
+
+
+def rebuild(chunk_size=5000):
+    """
+    Rebuilds the set and the Bloom filter from the database into temporary
+    keys, then merges them into the live keys and marks the index ready in
+    one transaction, so names added while the table was read aren't lost.
+    Returns the number of usernames.
+
+    Names in the live keys that are no longer in the database are kept; they
+    only make ``is_taken`` answer "taken" for a free name, which is safe.
+    """
+    client = get_redis()
+    tmp_index, tmp_bloom = f"{INDEX_KEY}:rebuild", f"{BLOOM_KEY}:rebuild"
+    client.delete(tmp_index, tmp_bloom)
+    # Make sure the Bloom key exists even when there are no users yet
+    client.setbit(tmp_bloom, settings.USERNAME_BLOOM_BITS - 1, 0)
+
+    count = 0
+    usernames = CustomUser.objects.exclude(username=None).values_list("username", flat=True)
+    pipe = client.pipeline(transaction=False)
+    for username in usernames.iterator(chunk_size=chunk_size):
+        username = normalize(username)
+        pipe.sadd(tmp_index, username)
+        for offset in _bloom_offsets(username):
+            pipe.setbit(tmp_bloom, offset, 1)
+        count += 1
+        if count % chunk_size == 0:
+            pipe.execute()
+    pipe.execute()
+
+    pipe = client.pipeline(transaction=True)
+    pipe.sunionstore(INDEX_KEY, [tmp_index, INDEX_KEY])
+    pipe.bitop("OR", BLOOM_KEY, tmp_bloom, BLOOM_KEY)
+    pipe.delete(tmp_index, tmp_bloom)
+    pipe.set(READY_KEY, "1")
+    pipe.execute()
+    return count
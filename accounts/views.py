@@ -1,18 +1,25 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
-from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
-from django.utils.html import strip_tags
-from django.template.loader import render_to_string
+from django.core import signing
 from django.utils.text import slugify
+from django.db import IntegrityError, transaction
 from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
 from django import forms
 from django.contrib.auth.forms import PasswordResetForm, SetPasswordForm
 from django.utils.translation import gettext_lazy as _
 import random
+import re
 import uuid
 
+from . import username_index
 from .models import CustomUser, EmailVerificationToken
+from .tokens import make_verification_token, read_verification_token
+from core.emails import serialize_context
+from DNarai.db_router import replica_reads
+from DNarai.ratelimit import ratelimit
+from DNarai.tasks import send_templated_email_task
 
 
 # -----------------------------
@@ -34,37 +41,62 @@ class CustomSetPasswordForm(SetPasswordForm):
 # -----------------------------
 # Username Helpers
 # -----------------------------
-def generate_unique_username(first_name, last_name):
-    base_username = slugify(f"{first_name}{last_name}")
-    username = base_username
-    counter = 0
-    while CustomUser.objects.filter(username=username).exists():
+def next_free_username(base_username, taken):
+    """
+    Returns ``base_username`` or the first ``base_username<N>`` (N >= 1)
+    that isn't in ``taken``.
+    """
+    if base_username not in taken:
+        return base_username
+    suffixes = set()
+    for username in taken:
+        suffix = username[len(base_username):]
+        if username.startswith(base_username) and suffix.isascii() and suffix.isdigit():
+            suffixes.add(int(suffix))
+    counter = 1
+    while counter in suffixes:
         counter += 1
-        username = f"{base_username}{counter}"
-    return username
+    return f"{base_username}{counter}"
+
+
+def generate_unique_username(first_name, last_name):
+    # Names with no ASCII letters or digits slugify to ""
+    base_username = slugify(f"{first_name}{last_name}") or "user"
+    # One anchored query (its literal prefix is served by the username
+    # pattern index) for the base and its numbered variants only, instead of
+    # one exists() per counter value
+    taken = set(
+        CustomUser.objects.filter(username__regex=rf"^{re.escape(base_username)}[0-9]*$").values_list(
+            "username", flat=True
+        )
+    )
+    return next_free_username(base_username, taken)
 
 def suggest_username(base_username):
-    for _ in range(5):
-        suggestion = f"{base_username}{random.randint(100, 999)}"
-        if not CustomUser.objects.filter(username=suggestion).exists():
-            return suggestion
+    candidates = {f"{base_username}{random.randint(100, 999)}" for _ in range(5)}
+    taken = set(CustomUser.objects.filter(username__in=candidates).values_list("username", flat=True))
+    for suggestion in sorted(candidates - taken):
+        return suggestion
     return f"{base_username}{uuid.uuid4().hex[:6]}"
 
 
 # -----------------------------
 # Check username availability
 # -----------------------------
-def check_username(request):
+@replica_reads
+async def check_username(request):
     username = request.GET.get("username", "").strip().lower()
     if not username:
         return JsonResponse({"available": False, "error": "Username cannot be empty"})
-    is_taken = CustomUser.objects.filter(username=username).exists()
-    return JsonResponse({"available": not is_taken})
+    response = JsonResponse({"available": not await username_index.ais_taken(username)})
+    patch_cache_control(response, private=True, max_age=settings.USERNAME_CHECK_MAX_AGE)
+    return response
 
 
 # -----------------------------
 # Signup View
 # -----------------------------
+@ratelimit("signup", keys=("ip",))
 def signup_view(request):
     if request.user.is_authenticated:
         return redirect("core:index")
@@ -76,34 +108,43 @@ def signup_view(request):
         email = request.POST.get("email", "").strip()
         password = request.POST.get("password", "").strip()
 
-        if not username:
+        generated = not username
+        if generated:
             username = generate_unique_username(first_name, last_name)
+
+        # Rely on the unique constraints instead of check-then-insert
+        for attempt in range(3):
+            try:
+                with transaction.atomic():
+                    user = CustomUser.objects.create_user(
+                        username=username,
+                        email=email,
+                        password=password,
+                        first_name=first_name,
+                        last_name=last_name,
+                        is_active=False
+                    )
+                break
+            except IntegrityError:
+                if not CustomUser.objects.filter(username=username).exists():
+                    return render(request, "accounts/signup.html", {"error": "Email already taken"})
+                if not generated:
+                    suggested = suggest_username(username)
+                    return render(
+                        request,
+                        "accounts/signup.html",
+                        {
+                            "error": "Username already taken",
+                            "suggested_username": suggested,
+                            "first_name": first_name,
+                            "last_name": last_name,
+                            "email": email
+                        }
+                    )
+                # A concurrent signup took the generated username; pick the next one
+                username = generate_unique_username(first_name, last_name)
         else:
-            if CustomUser.objects.filter(username=username).exists():
-                suggested = suggest_username(username)
-                return render(
-                    request,
-                    "accounts/signup.html",
-                    {
-                        "error": "Username already taken",
-                        "suggested_username": suggested,
-                        "first_name": first_name,
-                        "last_name": last_name,
-                        "email": email
-                    }
-                )
-
-        if CustomUser.objects.filter(email=email).exists():
-            return render(request, "accounts/signup.html", {"error": "Email already taken"})
-
-        user = CustomUser.objects.create_user(
-            username=username,
-            email=email,
-            password=password,
-            first_name=first_name,
-            last_name=last_name,
-            is_active=False
-        )
+            return render(request, "accounts/signup.html", {"error": "Username already taken"})
 
         send_verification_email(user)
         return render(request, "accounts/email_sent.html", {"email": email})
@@ -115,22 +156,29 @@ def signup_view(request):
 # Email Verification
 # -----------------------------
 def send_verification_email(user):
-    existing_token = EmailVerificationToken.objects.filter(user=user, is_used=False).last()
-    if existing_token and not existing_token.is_expired():
-        return
-    token = EmailVerificationToken.objects.create(user=user)
-    link = f"{settings.BASE_URL}/accounts/verify-email/{token.token}/"
-
-    subject = "Verify Your Account"
-    html_content = render_to_string("accounts/verification_email.html", {"link": link, "user": user})
-    text_content = strip_tags(html_content)
-
-    email = EmailMultiAlternatives(subject, text_content, settings.DEFAULT_FROM_EMAIL, [user.email])
-    email.attach_alternative(html_content, "text/html")
-    email.send()
+    if settings.SIGNED_LINK_TOKENS:
+        link = f"{settings.BASE_URL}/accounts/verify-email/{make_verification_token(user)}/"
+    else:
+        existing_token = EmailVerificationToken.objects.filter(user=user, is_used=False).last()
+        if existing_token and not existing_token.is_expired():
+            return
+        token = EmailVerificationToken.objects.create(user=user)
+        link = f"{settings.BASE_URL}/accounts/verify-email/{token.token}/"
+
+    # Rendered and sent by a worker over the pooled SMTP connections
+    send_templated_email_task.delay(
+        "accounts/verification_email.html",
+        "Verify Your Account",
+        [user.email],
+        serialize_context({"link": link, "user": user}),
+        settings.DEFAULT_FROM_EMAIL,
+    )
 
 
 def verify_email(request, token):
+    if not isinstance(token, uuid.UUID):
+        return verify_signed_email(request, token)
+
     try:
         token_obj = EmailVerificationToken.objects.get(token=token, is_used=False)
     except EmailVerificationToken.DoesNotExist:
@@ -150,9 +198,33 @@ def verify_email(request, token):
     return render(request, "accounts/verification_success.html", {"auto_login": True})
 
 
+def verify_signed_email(request, token):
+    """
+    Verifies a signed link. Expiry and tampering are checked in memory; the
+    user row is only read once the signature is valid.
+    """
+    try:
+        user_id = read_verification_token(token)
+    except signing.SignatureExpired:
+        return render(request, "accounts/verification_failed.html", {"error": "Token expired"})
+    except signing.BadSignature:
+        return render(request, "accounts/verification_failed.html", {"error": "Invalid or already used token"})
+
+    user = CustomUser.objects.filter(pk=user_id, is_active=False).first()
+    if user is None:
+        return render(request, "accounts/verification_failed.html", {"error": "Invalid or already used token"})
+
+    user.is_active = True
+    user.save(update_fields=["is_active"])
+
+    login(request, user, backend='accounts.auth_backends.UsernameOrEmailBackend')
+    return render(request, "accounts/verification_success.html", {"auto_login": True})
+
+
 # -----------------------------
 # Login View
 # -----------------------------
+@ratelimit("login", keys=("ip", "account"))
 def login_view(request):
     if request.method == "POST":
         # Automatically log out current user if switching accounts
@@ -162,16 +234,8 @@ def login_view(request):
         username_or_email = request.POST.get("email")
         password = request.POST.get("password")
 
+        # Matches username or email and hashes the password once
         user = authenticate(request, username=username_or_email, password=password)
-        if not user:
-            try:
-                from django.contrib.auth import get_user_model
-                User = get_user_model()
-                user_obj = User.objects.filter(email=username_or_email).first()
-                if user_obj:
-                    user = authenticate(request, username=user_obj.username, password=password)
-            except Exception:
-                pass
 
         if user:
             login(request, user)
@@ -194,6 +258,7 @@ def logout_view(request):
 # -----------------------------
 # Password Reset Request View
 # -----------------------------
+@ratelimit("password_reset", keys=("ip", "email"))
 def user_password_reset_request(request):
     if request.method == "POST":
         form = PasswordResetForm(request.POST)
@@ -1,13 +1,32 @@
 from django.contrib import admin
+from django.db.models.functions import Left
+
+from DNarai.db_router import ReplicaChangelistMixin
+from DNarai.paginator import EstimatedCountPaginator
 from .models import (
     SessionType,
     SessionDuration,
     SessionFormat,
     LeadershipSessionBooking,
     SendMessage,
+    EmailOutbox,
 )
 
 
+PREVIEW_LENGTH = 60
+
+
+def preview(field):
+    # One character more than shown, to know whether to add an ellipsis
+    return Left(field, PREVIEW_LENGTH + 1)
+
+
+def truncate(text):
+    if text and len(text) > PREVIEW_LENGTH:
+        return text[:PREVIEW_LENGTH] + "…"
+    return text
+
+
 class SessionTypeAdmin(admin.ModelAdmin):
     list_display = ("name",)
 
@@ -20,15 +39,21 @@ class SessionFormatAdmin(admin.ModelAdmin):
     list_display = ("name",)
 
 
-class LeadershipSessionBookingAdmin(admin.ModelAdmin):
+class LeadershipSessionBookingAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
     list_display = (
         "full_name",
         "session_type",
         "session_duration",
         "session_format",
-        "goals",
+        "goals_preview",
         "created_at",
     )
+    list_select_related = ("session_type", "session_duration", "session_format")
+    list_filter = ("is_mentor_confirmed", "is_session_completed", "session_type", "session_format")
+    date_hierarchy = "preferred_datetime"
+    ordering = ("-created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = (
         "mentor_confirmation_token",
         "session_completion_token",
@@ -36,10 +61,35 @@ class LeadershipSessionBookingAdmin(admin.ModelAdmin):
         "completed_at",
     )
 
+    def get_queryset(self, request):
+        # Only the start of the goals text is shown, so don't load all of it
+        return super().get_queryset(request).defer("goals").annotate(goals_start=preview("goals"))
 
-class SendMessageAdmin(admin.ModelAdmin):
-    list_display = ("full_name", "email", "created_at")
+    @admin.display(description="Goals")
+    def goals_preview(self, obj):
+        return truncate(obj.goals_start)
+
+
+class SendMessageAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("full_name", "email", "message_preview", "created_at")
     readonly_fields = ("full_name", "email", "message", "created_at")
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).defer("message").annotate(message_start=preview("message"))
+
+    @admin.display(description="Message")
+    def message_preview(self, obj):
+        return truncate(obj.message_start)
+
+
+class EmailOutboxAdmin(ReplicaChangelistMixin, admin.ModelAdmin):
+    list_display = ("subject", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = ("created_at", "sent_at", "attempts", "last_error")
     ordering = ("-created_at",)
 
 
@@ -48,3 +98,4 @@ admin.site.register(SessionDuration, SessionDurationAdmin)
 admin.site.register(SessionFormat, SessionFormatAdmin)
 admin.site.register(LeadershipSessionBooking, LeadershipSessionBookingAdmin)
 admin.site.register(SendMessage, SendMessageAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
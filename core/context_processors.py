@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def cache_settings(request):
+    """Timeouts used by ``{% cache %}`` blocks in the templates."""
+    return {"FRAGMENT_CACHE_SECONDS": settings.FRAGMENT_CACHE_SECONDS}
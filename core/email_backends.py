@@ -10,6 +10,16 @@ class SMTPAndConsoleBackend:
         self.smtp_backend = SMTPBackend(*args, **kwargs)
         self.console_backend = ConsoleBackend(*args, **kwargs)
 
+    @property
+    def connection(self):
+        return self.smtp_backend.connection
+
+    def open(self):
+        return self.smtp_backend.open()
+
+    def close(self):
+        self.smtp_backend.close()
+
     def send_messages(self, email_messages):
         smtp_sent = self.smtp_backend.send_messages(email_messages)
         self.console_backend.send_messages(email_messages)
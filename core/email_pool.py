@@ -0,0 +1,198 @@
+import logging
+import os
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from DNarai.metrics import SMTP_SEND_LATENCY
+from DNarai.profiling import record_smtp
+
+logger = logging.getLogger(__name__)
+
+
+class EmailPoolTimeout(Exception):
+    """Raised when no pooled connection becomes free in time."""
+
+
+class EmailConnectionPool:
+    """
+    Keeps authenticated email backend connections open across Celery tasks.
+
+    Connections are created with Django's ``get_connection()`` so the
+    configured ``EMAIL_BACKEND`` is respected. Idle connections are closed
+    after ``EMAIL_POOL_IDLE_TIMEOUT`` seconds, and connections that have sat
+    unused longer than ``EMAIL_POOL_HEALTHCHECK_INTERVAL`` are probed with
+    ``NOOP`` before being handed out again.
+    """
+
+    def __init__(self, max_connections=None, idle_timeout=None, healthcheck_interval=None, timeout=None):
+        self._max_connections = max_connections
+        self._idle_timeout = idle_timeout
+        self._healthcheck_interval = healthcheck_interval
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = []  # (connection, last_used) pairs, most recent last
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    @property
+    def max_connections(self):
+        return self._max_connections or settings.EMAIL_POOL_MAX_CONNECTIONS
+
+    @property
+    def idle_timeout(self):
+        return self._idle_timeout or settings.EMAIL_POOL_IDLE_TIMEOUT
+
+    @property
+    def healthcheck_interval(self):
+        return self._healthcheck_interval or settings.EMAIL_POOL_HEALTHCHECK_INTERVAL
+
+    @property
+    def timeout(self):
+        return self._timeout or settings.EMAIL_POOL_TIMEOUT
+
+    def _check_pid(self):
+        # A forked child must never reuse sockets opened by its parent.
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+
+    @staticmethod
+    def _is_alive(connection):
+        if not hasattr(connection, "connection"):
+            # Non-SMTP backends (console, locmem, ...) have nothing to probe.
+            return True
+        smtp = connection.connection
+        if smtp is None:
+            # Closed, e.g. after a failed reconnect
+            return False
+        try:
+            return smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            logger.debug("[Email Pool] Error closing connection", exc_info=True)
+
+    def _checkout(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection, last_used = self._idle.pop()
+
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._close(connection)
+                continue
+            if idle_for > self.healthcheck_interval and not self._is_alive(connection):
+                logger.info("[Email Pool] Dropping broken idle connection")
+                self._close(connection)
+                continue
+            return connection
+
+        connection = get_connection()
+        connection.open()
+        return connection
+
+    def _checkin(self, connection):
+        if getattr(connection, "connection", True) is None:
+            # An SMTP backend left closed; sending through it would open a
+            # new socket per message instead of reusing one.
+            self._close(connection)
+            return
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow an open connection. It is returned to the pool on success and
+        discarded if the block raises.
+        """
+        self._check_pid()
+        slots = self._slots
+        if not slots.acquire(timeout=self.timeout):
+            raise EmailPoolTimeout(
+                f"No email connection available after {self.timeout}s "
+                f"(max {self.max_connections} per process)"
+            )
+        try:
+            connection = self._checkout()
+            try:
+                yield connection
+            except Exception:
+                self._close(connection)
+                raise
+            else:
+                self._checkin(connection)
+        finally:
+            slots.release()
+
+    def send_messages(self, email_messages):
+        """
+        Send ``email_messages`` over one pooled connection.
+
+        A message that fails because the socket went away is retried once on
+        a fresh connection. Returns a list of ``(message, exception)`` pairs
+        for the messages that could not be sent.
+        """
+        email_messages = list(email_messages)
+        failed = []
+        with self.connection() as connection:
+            for index, message in enumerate(email_messages):
+                message.connection = connection
+                started = time.perf_counter()
+                try:
+                    try:
+                        message.send()
+                    except (smtplib.SMTPServerDisconnected, OSError):
+                        logger.info("[Email Pool] Connection lost, reconnecting")
+                        self._close(connection)
+                        try:
+                            connection.open()
+                        except Exception as e:
+                            # Leave it closed so it isn't returned to the pool,
+                            # and fail the rest without trying each one
+                            self._close(connection)
+                            logger.warning(
+                                "[Email Pool] Could not reconnect, failing %d message(s)",
+                                len(email_messages) - index,
+                                exc_info=True,
+                            )
+                            failed.extend((pending, e) for pending in email_messages[index:])
+                            break
+                        message.send()
+                except Exception as e:
+                    SMTP_SEND_LATENCY.labels("failed").observe(time.perf_counter() - started)
+                    failed.append((message, e))
+                else:
+                    SMTP_SEND_LATENCY.labels("sent").observe(time.perf_counter() - started)
+                finally:
+                    record_smtp(time.perf_counter() - started)
+        return failed
+
+    def close_all(self):
+        """Close every idle connection held by this process."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            self._close(connection)
+        if idle:
+            logger.info("[Email Pool] Closed %d pooled connection(s)", len(idle))
+
+
+email_pool = EmailConnectionPool()
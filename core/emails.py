@@ -0,0 +1,84 @@
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import models
+from django.template.loader import get_template
+
+from . import lookups
+
+logger = logging.getLogger(__name__)
+
+# Templates rendered by Celery workers; loaded once per worker process.
+EMAIL_TEMPLATES = [
+    "emails/admin_notification_email.html",
+    "emails/confirmation_email.html",
+    "emails/mentee_confirmation.html",
+    "emails/mentor_invite.html",
+    "emails/session_completion_prompt.html",
+    "emails/session_confirmed_mentee.html",
+    "emails/session_reminder.html",
+    "accounts/verification_email.html",
+]
+
+MODEL_REF_KEY = "__model__"
+
+
+def serialize_context(context):
+    """
+    Turns a template context into a small JSON-safe dict.
+
+    Model instances are replaced by ``{"__model__": "app_label.model", "pk": pk}``
+    references so only IDs travel through the broker or the outbox table.
+    """
+    serialized = {}
+    for key, value in (context or {}).items():
+        if isinstance(value, models.Model):
+            value = {MODEL_REF_KEY: value._meta.label_lower, "pk": value.pk}
+        serialized[key] = value
+    return serialized
+
+
+def resolve_contexts(contexts):
+    """
+    Replaces model references in several serialized contexts, loading all
+    referenced rows with one ``in_bulk`` query per model.
+    """
+    wanted = defaultdict(set)
+    for context in contexts:
+        for value in context.values():
+            if isinstance(value, dict) and MODEL_REF_KEY in value:
+                wanted[value[MODEL_REF_KEY]].add(value["pk"])
+
+    loaded = {
+        label: apps.get_model(label).objects.in_bulk(pks)
+        for label, pks in wanted.items()
+    }
+    for rows in loaded.values():
+        lookups.attach(rows.values())
+
+    resolved = []
+    for context in contexts:
+        context = dict(context)
+        for key, value in context.items():
+            if isinstance(value, dict) and MODEL_REF_KEY in value:
+                context[key] = loaded[value[MODEL_REF_KEY]].get(value["pk"])
+        resolved.append(context)
+    return resolved
+
+
+def render_email(template_name, context):
+    """Renders an email template with an already resolved context."""
+    return get_template(template_name).render(context)
+
+
+def warm_email_templates():
+    """
+    Compiles every email template into the cached template loader so the
+    first task in a fresh worker process doesn't pay for parsing.
+    """
+    for template_name in EMAIL_TEMPLATES:
+        try:
+            get_template(template_name)
+        except Exception:
+            logger.exception("[Emails] Could not preload template %s", template_name)
@@ -1,8 +1,46 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
 from .models import LeadershipSessionBooking
+from . import lookups
 import pytz
 
 
+class CachedModelChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in lookups.rows(self.queryset.model):
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(lookups.rows(self.queryset.model)) + (self.field.empty_label is not None)
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(lookups.rows(self.queryset.model))
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    Choice field for the session lookup tables, served from
+    ``core.lookups`` instead of querying on every render and validation.
+    """
+
+    iterator = CachedModelChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return lookups.row(self.queryset.model, int(value))
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+
+
 class LeadershipSessionBookingForm(forms.ModelForm):
     timezone = forms.ChoiceField(
         choices=[(tz, tz) for tz in pytz.common_timezones],
@@ -14,6 +52,11 @@ class LeadershipSessionBookingForm(forms.ModelForm):
     class Meta:
         model = LeadershipSessionBooking
         fields = "__all__"
+        field_classes = {
+            "session_type": CachedModelChoiceField,
+            "session_duration": CachedModelChoiceField,
+            "session_format": CachedModelChoiceField,
+        }
         widgets = {
             "preferred_datetime": forms.DateTimeInput(
                 attrs={
@@ -32,3 +75,11 @@ class LeadershipSessionBookingForm(forms.ModelForm):
                 f"{existing_classes} form-control text-black".strip()
             )
             field.widget.attrs["placeholder"] = field.label
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        # Already checked against the cached lookup tables; the FK constraint still applies
+        exclude.update(
+            name for name, field in self.fields.items() if isinstance(field, CachedModelChoiceField)
+        )
+        return exclude
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from DNarai.cache import invalidate, namespace_version
+from .models import SessionDuration, SessionFormat, SessionType
+
+logger = logging.getLogger(__name__)
+
+LOOKUP_MODELS = (SessionType, SessionDuration, SessionFormat)
+NAMESPACE = "lookups"
+
+_lock = threading.Lock()
+_state = {"version": None, "checked_at": 0.0, "tables": {}}
+
+
+def _shared_version():
+    try:
+        return namespace_version(NAMESPACE)
+    except redis.RedisError:
+        # Keep serving what we have; it is at most one change behind
+        return _state["version"]
+
+
+def _tables():
+    """
+    The lookup tables as ``{model: {pk: instance}}``, loaded once per process
+    and reloaded when the shared version changes. The version is checked at
+    most every LOOKUP_CACHE_CHECK_SECONDS.
+    """
+    now = time.monotonic()
+    if _state["tables"] and now - _state["checked_at"] < settings.LOOKUP_CACHE_CHECK_SECONDS:
+        return _state["tables"]
+
+    version = _shared_version()
+    with _lock:
+        if not _state["tables"] or version != _state["version"]:
+            _state["tables"] = {
+                model: {obj.pk: obj for obj in model.objects.order_by("pk")}
+                for model in LOOKUP_MODELS
+            }
+            _state["version"] = version
+        _state["checked_at"] = now
+    return _state["tables"]
+
+
+def rows(model):
+    """Cached rows of a lookup model, in primary key order."""
+    return list(_tables()[model].values())
+
+
+def row(model, pk):
+    """Cached row of a lookup model; raises KeyError if there is none."""
+    return _tables()[model][pk]
+
+
+def attach(instances):
+    """
+    Fills foreign keys to lookup models on ``instances`` from the cache, so
+    accessing them doesn't query.
+    """
+    tables = None
+    for instance in instances:
+        for field in instance._meta.concrete_fields:
+            if field.is_relation and field.related_model in LOOKUP_MODELS:
+                tables = tables or _tables()
+                pk = getattr(instance, field.attname)
+                if pk in tables[field.related_model] and not field.is_cached(instance):
+                    field.set_cached_value(instance, tables[field.related_model][pk])
+
+
+def bump_version():
+    """Makes every process reload the lookup tables once this transaction commits."""
+    def bump():
+        _state["tables"] = {}
+        try:
+            invalidate(NAMESPACE)
+        except redis.RedisError:
+            logger.warning("[Lookups] Could not bump the shared version", exc_info=True)
+    transaction.on_commit(bump)
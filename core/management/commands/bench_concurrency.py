@@ -0,0 +1,96 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+async def slow_request(url, path, trickle_seconds, timeout):
+    """
+    One client that sends its request headers slowly (one header every
+    ``trickle_seconds / 4``), then reads the response. Returns
+    ``(status, seconds)``; status is None if the request failed.
+    """
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(parts.hostname, port, ssl=parts.scheme == "https"), timeout
+        )
+        try:
+            headers = [
+                f"GET {path} HTTP/1.1\r\n",
+                f"Host: {parts.netloc}\r\n",
+                "User-Agent: bench_concurrency\r\n",
+                "Accept: */*\r\n",
+                "Connection: close\r\n",
+            ]
+            for line in headers:
+                writer.write(line.encode())
+                await writer.drain()
+                if trickle_seconds:
+                    await asyncio.sleep(trickle_seconds / (len(headers) - 1))
+            writer.write(b"\r\n")
+            await writer.drain()
+
+            status_line = await asyncio.wait_for(reader.readline(), timeout)
+            await asyncio.wait_for(reader.read(), timeout)
+        finally:
+            writer.close()
+        status = int(status_line.split()[1])
+    except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+        status = None
+    return status, time.perf_counter() - started
+
+
+async def run_load(url, path, clients, trickle_seconds, timeout):
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(slow_request(url, path, trickle_seconds, timeout) for _ in range(clients))
+    )
+    return results, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Opens many concurrent slow or bursty connections against a WSGI and an "
+        "ASGI deployment of the app and reports how many complete and how fast."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--wsgi-url", help="Base URL of the gunicorn deployment, e.g. http://localhost:8001")
+        parser.add_argument("--asgi-url", help="Base URL of the daphne deployment, e.g. http://localhost:8000")
+        parser.add_argument("--path", default="/accounts/check-username/?username=bench-user")
+        parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 200])
+        parser.add_argument(
+            "--trickle",
+            type=float,
+            default=2.0,
+            help="Seconds each client takes to send its headers; 0 for a burst of fast clients.",
+        )
+        parser.add_argument("--timeout", type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        targets = [(name, options[f"{name}_url"]) for name in ("wsgi", "asgi") if options[f"{name}_url"]]
+        if not targets:
+            raise CommandError("Pass --wsgi-url and/or --asgi-url.")
+
+        self.stdout.write(
+            f"{'server':<8}{'clients':>8}{'ok':>6}{'errors':>8}{'p50 s':>8}{'p95 s':>8}{'max s':>8}{'req/s':>8}"
+        )
+        for clients in options["clients"]:
+            for name, url in targets:
+                results, elapsed = asyncio.run(
+                    run_load(url.rstrip("/"), options["path"], clients, options["trickle"], options["timeout"])
+                )
+                latencies = sorted(seconds for status, seconds in results if status and status < 500)
+                errors = clients - len(latencies)
+                p50 = statistics.median(latencies) if latencies else 0
+                p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+                worst = latencies[-1] if latencies else 0
+                self.stdout.write(
+                    f"{name:<8}{clients:>8}{len(latencies):>6}{errors:>8}"
+                    f"{p50:>8.2f}{p95:>8.2f}{worst:>8.2f}{len(latencies) / elapsed:>8.1f}"
+                )
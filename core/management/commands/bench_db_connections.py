@@ -0,0 +1,76 @@
+import importlib.util
+import time
+
+import dj_database_url
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.utils import ConnectionHandler
+
+ALIAS = "bench"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the database cost of a request (connect if needed, one query, "
+        "request cleanup) with a new connection per request versus persistent "
+        "and pooled connections."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--database-url",
+            help="Database to measure instead of the default one, e.g. PgBouncer's address",
+        )
+
+    def handle(self, *args, **options):
+        if options["database_url"]:
+            base = dj_database_url.parse(options["database_url"])
+        else:
+            base = dict(settings.DATABASES["default"])
+        base_options = {k: v for k, v in base.get("OPTIONS", {}).items() if k != "pool"}
+
+        modes = [
+            ("none", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": base_options}),
+            ("persistent", {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True, "OPTIONS": base_options}),
+        ]
+        if base["ENGINE"] == "django.db.backends.postgresql" and importlib.util.find_spec("psycopg_pool"):
+            pool = {"min_size": 1, "max_size": 2, "timeout": settings.DB_POOL_TIMEOUT}
+            modes.append(
+                ("pool", {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": True, "OPTIONS": {**base_options, "pool": pool}})
+            )
+        else:
+            self.stdout.write("Skipping pool mode: needs Postgres and psycopg_pool.")
+
+        self.stdout.write(f"{'mode':<12}{'connects':>10}{'ms/request':>12}")
+        for name, overrides in modes:
+            connects, elapsed = self.run({**base, **overrides}, options["requests"])
+            self.stdout.write(f"{name:<12}{connects:>10}{elapsed * 1000 / options['requests']:>12.3f}")
+
+    def run(self, database, requests):
+        connection = ConnectionHandler({"default": database, ALIAS: database})[ALIAS]
+        connects = 0
+        try:
+            self.request(connection)  # warm up (first connection, pool start)
+            started = time.perf_counter()
+            for _ in range(requests):
+                if connection.connection is None:
+                    connects += 1
+                self.request(connection)
+            elapsed = time.perf_counter() - started
+            if getattr(connection, "pool", None) is not None:
+                # Closing only returns the connection; count what the pool opened
+                connects = connection.pool.get_stats().get("connections_num", 0)
+            return connects, elapsed
+        finally:
+            connection.close()
+            if getattr(connection, "pool", None) is not None:
+                connection.close_pool()
+
+    def request(self, connection):
+        # What the request_started / request_finished handlers do around a view
+        connection.close_if_unusable_or_obsolete()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+        connection.close_if_unusable_or_obsolete()
@@ -0,0 +1,94 @@
+import json
+import time
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from core.emails import serialize_context
+from core.models import LeadershipSessionBooking, SessionDuration, SessionFormat, SessionType
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the booking emails' payload size and web-side cost when the "
+        "web process renders HTML (before) versus sending template references (after)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options["iterations"])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, iterations):
+        booking = LeadershipSessionBooking.objects.create(
+            full_name="Benchmark Mentee",
+            email="mentee@example.com",
+            preferred_datetime=timezone.now() + timedelta(days=3),
+            timezone="Africa/Lagos",
+            session_type=SessionType.objects.get_or_create(name="Benchmark")[0],
+            session_duration=SessionDuration.objects.get_or_create(label="Benchmark", duration_minutes=60)[0],
+            session_format=SessionFormat.objects.get_or_create(name="Benchmark")[0],
+            goals="Grow as a leader. " * 20,
+        )
+        mentor_link = f"{settings.BASE_URL}/confirm-session/{booking.mentor_confirmation_token}/"
+
+        def before():
+            return [
+                json.dumps([
+                    "Mentorship Session Booking Confirmation",
+                    render_to_string("emails/mentee_confirmation.html", {"booking": booking}),
+                    [booking.email],
+                    settings.DEFAULT_FROM_EMAIL,
+                ]),
+                json.dumps([
+                    "New Mentorship Session Request",
+                    render_to_string("emails/mentor_invite.html", {"booking": booking, "mentor_link": mentor_link}),
+                    [settings.DEFAULT_MENTOR_EMAIL],
+                    settings.DEFAULT_FROM_EMAIL,
+                ]),
+            ]
+
+        def after():
+            return [
+                json.dumps([
+                    "emails/mentee_confirmation.html",
+                    "Mentorship Session Booking Confirmation",
+                    [booking.email],
+                    serialize_context({"booking": booking}),
+                    settings.DEFAULT_FROM_EMAIL,
+                ]),
+                json.dumps([
+                    "emails/mentor_invite.html",
+                    "New Mentorship Session Request",
+                    [settings.DEFAULT_MENTOR_EMAIL],
+                    serialize_context({"booking": booking, "mentor_link": mentor_link}),
+                    settings.DEFAULT_FROM_EMAIL,
+                ]),
+            ]
+
+        self.stdout.write(f"{'mode':<8}{'payload bytes':>15}{'zlib bytes':>12}{'web ms/request':>16}")
+        for name, build in (("before", before), ("after", after)):
+            build()  # warm the template cache
+            started = time.perf_counter()
+            for _ in range(iterations):
+                payloads = build()
+            elapsed_ms = (time.perf_counter() - started) * 1000 / iterations
+
+            raw = sum(len(p.encode()) for p in payloads)
+            compressed = sum(len(zlib.compress(p.encode())) for p in payloads)
+            self.stdout.write(f"{name:<8}{raw:>15}{compressed:>12}{elapsed_ms:>16.3f}")
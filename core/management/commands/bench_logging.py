@@ -0,0 +1,95 @@
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from DNarai.log import ContextFilter, QueuedHandler
+
+
+class SlowStream:
+    """File stream whose writes take ``delay`` seconds, like a busy or network disk."""
+
+    def __init__(self, stream, delay):
+        self.stream = stream
+        self.delay = delay
+
+    def write(self, text):
+        time.sleep(self.delay)
+        return self.stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures what a log call costs the calling thread with the old setup "
+        "(f-strings, synchronous FileHandler) and the queued one (%%-style "
+        "arguments, QueuedHandler writing JSON from a background thread)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=20000)
+        parser.add_argument(
+            "--write-delay-ms",
+            type=float,
+            default=0,
+            help="Simulated time each write to the log file takes",
+        )
+
+    def handle(self, *args, **options):
+        calls = options["calls"]
+        booking = {"id": 42, "email": "mentee@example.com"}
+        mentor_email = "mentor@example.com"
+
+        with tempfile.TemporaryDirectory() as directory:
+            before = logging.FileHandler(Path(directory) / "before.log")
+            before.setFormatter(logging.Formatter("{levelname} {asctime} {name} {message}", style="{"))
+            after = QueuedHandler(Path(directory) / "after.log", console=False, queue_size=calls + 1)
+            after.addFilter(ContextFilter())
+            if options["write_delay_ms"]:
+                delay = options["write_delay_ms"] / 1000
+                for handler in (before, after.targets[0]):
+                    handler.setStream(SlowStream(handler.stream or handler._open(), delay))
+
+            def f_string(logger, level):
+                logger.log(
+                    level,
+                    f"Queued booking confirmation to mentee {booking['email']} and invite to mentor {mentor_email}",
+                )
+
+            def lazy(logger, level):
+                logger.log(
+                    level,
+                    "Queued booking confirmation to mentee %s and invite to mentor %s",
+                    booking["email"],
+                    mentor_email,
+                )
+
+            self.stdout.write(f"{'setup':<32}{'us/call':>10}{'max us':>10}")
+            for name, handler, call, level in (
+                ("before (file, f-string)", before, f_string, logging.INFO),
+                ("after (queued, %-style)", after, lazy, logging.INFO),
+                ("disabled level, f-string", before, f_string, logging.DEBUG),
+                ("disabled level, %-style", after, lazy, logging.DEBUG),
+            ):
+                logger = logging.getLogger(f"bench_logging.{name}")
+                logger.propagate = False
+                logger.setLevel(logging.INFO)
+                logger.addHandler(handler)
+
+                slowest = 0.0
+                started = time.perf_counter()
+                for _ in range(calls):
+                    call_started = time.perf_counter()
+                    call(logger, level)
+                    slowest = max(slowest, time.perf_counter() - call_started)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{name:<32}{elapsed * 1e6 / calls:>10.2f}{slowest * 1e6:>10.0f}")
+
+            started = time.perf_counter()
+            after.close()  # waits for the listener to write everything queued
+            self.stdout.write(f"Queued records flushed {(time.perf_counter() - started) * 1000:.1f}ms after the calls")
+            before.close()
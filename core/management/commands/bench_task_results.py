@@ -0,0 +1,69 @@
+import uuid
+
+from celery.app.trace import build_tracer
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django_celery_results.models import TaskResult
+
+from core.email_pool import email_pool
+from DNarai.celery import app
+from DNarai.tasks import send_email_task
+
+WRITES = ("INSERT", "UPDATE", "DELETE")
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs send_email_task through Celery's worker tracer (with a locmem "
+        "email backend) and counts the database writes made per email sent, "
+        "storing results (before) versus with the task's ignore_result policy (after)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--emails", type=int, default=200)
+
+    def handle(self, *args, **options):
+        if not app.backend.__class__.__module__.startswith("django_celery_results"):
+            self.stderr.write(f"The result backend is {app.backend!r}; this measures the django-db backend.")
+            return
+
+        emails = options["emails"]
+        indexes = 1 + sum(1 for f in TaskResult._meta.fields if f.unique) + len(TaskResult._meta.indexes)
+        self.stdout.write(f"{TaskResult._meta.db_table} has {indexes} indexes, each updated by every row write")
+        self.stdout.write(f"{'policy':<28}{'writes/email':>14}{'result rows/email':>19}")
+
+        email_pool.close_all()
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            for name, ignore_result in (("before (store results)", False), ("after (ignore_result)", True)):
+                writes, rows = self.measure(emails, ignore_result)
+                self.stdout.write(f"{name:<28}{writes / emails:>14.2f}{rows / emails:>19.2f}")
+        email_pool.close_all()
+
+    def measure(self, emails, ignore_result):
+        configured = send_email_task.ignore_result
+        send_email_task.ignore_result = ignore_result
+        try:
+            trace = build_tracer(send_email_task.name, send_email_task, app=app)
+            with transaction.atomic():
+                before = TaskResult.objects.count()
+                with CaptureQueriesContext(connection) as queries:
+                    for n in range(emails):
+                        task_id = str(uuid.uuid4())
+                        trace(
+                            task_id,
+                            ["Benchmark", "<p>Hello</p>", [f"mentee{n}@example.com"]],
+                            {},
+                            request={"id": task_id, "task": send_email_task.name, "delivery_info": {}},
+                        )
+                writes = sum(1 for q in queries if q["sql"].lstrip().upper().startswith(WRITES))
+                rows = TaskResult.objects.count() - before
+                raise Rollback
+        except Rollback:
+            return writes, rows
+        finally:
+            send_email_task.ignore_result = configured
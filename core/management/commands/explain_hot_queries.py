@@ -0,0 +1,106 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import LeadershipSessionBooking, SessionDuration, SessionFormat, SessionType
+from DNarai.tasks import due_completion_prompt_queryset, pending_reminder_queryset
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN ANALYZE for the booking token lookups and the reminder and "
+        "completion-prompt queries, optionally against a seeded dataset that is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Number of bookings to insert before explaining.")
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded rows instead of rolling back.")
+        parser.add_argument(
+            "--fail-on-seqscan",
+            action="store_true",
+            help="Exit with an error if any plan scans the bookings table sequentially.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options["seed"]:
+                    self.seed(options["seed"])
+                seq_scans = self.explain_all()
+                if not options["keep"]:
+                    raise Rollback
+        except Rollback:
+            pass
+
+        if seq_scans and options["fail_on_seqscan"]:
+            raise CommandError(f"Sequential scan on bookings in: {', '.join(seq_scans)}")
+
+    def seed(self, count):
+        session_type = SessionType.objects.get_or_create(name="Seeded")[0]
+        session_duration = SessionDuration.objects.get_or_create(label="Seeded", duration_minutes=60)[0]
+        session_format = SessionFormat.objects.get_or_create(name="Seeded")[0]
+        now = timezone.now()
+
+        batch = []
+        for i in range(count):
+            preferred_datetime = now + timedelta(minutes=random.randint(-60 * 24 * 90, 60 * 24 * 90))
+            session_end_at = preferred_datetime + session_duration.get_timedelta()
+            batch.append(LeadershipSessionBooking(
+                full_name=f"Seeded Mentee {i}",
+                email=f"seeded{i}@example.com",
+                preferred_datetime=preferred_datetime,
+                session_end_at=session_end_at,
+                completion_prompt_sent_at=session_end_at if session_end_at < now and random.random() < 0.95 else None,
+                timezone="Africa/Lagos",
+                session_type=session_type,
+                session_duration=session_duration,
+                session_format=session_format,
+                is_mentor_confirmed=random.random() < 0.7,
+                is_session_completed=random.random() < 0.5,
+                mentor_confirmation_token=uuid.uuid4().hex,
+                session_completion_token=uuid.uuid4().hex,
+            ))
+            if len(batch) == 5000:
+                LeadershipSessionBooking.objects.bulk_create(batch)
+                batch = []
+        LeadershipSessionBooking.objects.bulk_create(batch)
+
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {LeadershipSessionBooking._meta.db_table}")
+        self.stdout.write(f"Seeded {count} bookings")
+
+    def explain_all(self):
+        sample = LeadershipSessionBooking.objects.exclude(mentor_confirmation_token=None).first()
+        mentor_token = sample.mentor_confirmation_token if sample else uuid.uuid4().hex
+        completion_token = sample.session_completion_token if sample else uuid.uuid4().hex
+
+        queries = {
+            "confirm_session_view": LeadershipSessionBooking.objects.filter(
+                mentor_confirmation_token=mentor_token
+            ),
+            "complete_session_view": LeadershipSessionBooking.objects.filter(
+                session_completion_token=completion_token
+            ),
+            "send_pending_session_reminders": pending_reminder_queryset(timezone.now()),
+            "send_due_completion_prompts": due_completion_prompt_queryset(timezone.now()),
+        }
+
+        explain_options = {"analyze": True} if connection.vendor == "postgresql" else {}
+        seq_scans = []
+        table = LeadershipSessionBooking._meta.db_table
+        for name, queryset in queries.items():
+            plan = queryset.explain(**explain_options)
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(plan + "\n")
+            if f"Seq Scan on {table}" in plan or f"SCAN {table}" in plan:
+                seq_scans.append(name)
+        return seq_scans
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from DNarai.cache import invalidate_pages
+
+
+class Command(BaseCommand):
+    help = "Drops cached anonymous pages, e.g. after deploying template changes."
+
+    def handle(self, *args, **options):
+        invalidate_pages()
+        self.stdout.write(self.style.SUCCESS("Page cache invalidated"))
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_emailoutbox_template'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='leadershipsessionbooking',
+            name='mentor_confirmation_token',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='leadershipsessionbooking',
+            name='session_completion_token',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='leadershipsessionbooking',
+            index=models.Index(condition=models.Q(('is_mentor_confirmed', False), ('is_session_completed', False)), fields=['preferred_datetime', 'last_reminder_sent_at'], name='core_booking_reminder_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:47
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_fingerprints(apps, schema_editor):
+    SendMessage = apps.get_model("core", "SendMessage")
+    batch = []
+    for message in SendMessage.objects.filter(fingerprint="").only("id", "email", "message").iterator(chunk_size=2000):
+        normalized = f"{message.email.strip().lower()}\n{' '.join(message.message.split())}"
+        message.fingerprint = hashlib.sha256(normalized.encode()).hexdigest()
+        batch.append(message)
+        if len(batch) == 2000:
+            SendMessage.objects.bulk_update(batch, ["fingerprint"])
+            batch = []
+    SendMessage.objects.bulk_update(batch, ["fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_booking_token_and_reminder_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sendmessage',
+            name='fingerprint',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='sendmessage',
+            index=models.Index(fields=['fingerprint', 'created_at'], name='core_sendmessage_dedupe_idx'),
+        ),
+    ]
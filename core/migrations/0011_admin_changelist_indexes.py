@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_sendmessage_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='leadershipsessionbooking',
+            index=models.Index(fields=['-created_at'], name='core_booking_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leadershipsessionbooking',
+            index=models.Index(fields=['is_mentor_confirmed', 'is_session_completed', '-created_at'], name='core_booking_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leadershipsessionbooking',
+            index=models.Index(fields=['preferred_datetime'], name='core_booking_preferred_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sendmessage',
+            index=models.Index(fields=['-created_at'], name='core_sendmessage_created_idx'),
+        ),
+    ]
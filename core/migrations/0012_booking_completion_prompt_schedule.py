@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:59
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_session_end(apps, schema_editor):
+    """
+    Fills session_end_at. Bookings that have already ended were prompted by
+    their ETA task, so they are marked as prompted to keep the sweeper from
+    emailing them again.
+    """
+    Booking = apps.get_model("core", "LeadershipSessionBooking")
+    now = timezone.now()
+    batch = []
+    bookings = Booking.objects.select_related("session_duration").only(
+        "id", "preferred_datetime", "session_duration__duration_minutes"
+    )
+    for booking in bookings.iterator(chunk_size=2000):
+        booking.session_end_at = booking.preferred_datetime + timedelta(
+            minutes=booking.session_duration.duration_minutes
+        )
+        if booking.session_end_at <= now:
+            booking.completion_prompt_sent_at = booking.session_end_at
+        batch.append(booking)
+        if len(batch) == 2000:
+            Booking.objects.bulk_update(batch, ["session_end_at", "completion_prompt_sent_at"])
+            batch = []
+    Booking.objects.bulk_update(batch, ["session_end_at", "completion_prompt_sent_at"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_admin_changelist_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leadershipsessionbooking',
+            name='completion_prompt_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='leadershipsessionbooking',
+            name='session_end_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='leadershipsessionbooking',
+            index=models.Index(condition=models.Q(('completion_prompt_sent_at__isnull', True), ('is_session_completed', False)), fields=['session_end_at'], name='core_booking_prompt_due_idx'),
+        ),
+        migrations.RunPython(backfill_session_end, migrations.RunPython.noop),
+    ]
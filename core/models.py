@@ -1,4 +1,6 @@
+import hashlib
 from django.db import models
+from django.db.models import Q
 from datetime import timedelta
 from django.utils import timezone
 
@@ -50,14 +52,41 @@ class LeadershipSessionBooking(models.Model):
     is_session_completed = models.BooleanField(default=False)
     is_session_held = models.BooleanField(null=True, blank=True)
 
-    mentor_confirmation_token = models.CharField(max_length=64, blank=True, null=True)
-    session_completion_token = models.CharField(max_length=64, blank=True, null=True)
+    mentor_confirmation_token = models.CharField(max_length=64, blank=True, null=True, unique=True)
+    session_completion_token = models.CharField(max_length=64, blank=True, null=True, unique=True)
     token_generated_at = models.DateTimeField(auto_now_add=True)
 
     confirmed_at = models.DateTimeField(blank=True, null=True)
     completed_at = models.DateTimeField(blank=True, null=True)
     last_reminder_sent_at = models.DateTimeField(null=True, blank=True)
 
+    # Kept in step with preferred_datetime + session_duration by save()
+    session_end_at = models.DateTimeField(null=True, blank=True, editable=False)
+    completion_prompt_sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Matches the send_pending_session_reminders predicate
+            models.Index(
+                fields=["preferred_datetime", "last_reminder_sent_at"],
+                name="core_booking_reminder_idx",
+                condition=Q(is_mentor_confirmed=False, is_session_completed=False),
+            ),
+            # Admin changelist: default ordering, status filters, date hierarchy
+            models.Index(fields=["-created_at"], name="core_booking_created_idx"),
+            models.Index(
+                fields=["is_mentor_confirmed", "is_session_completed", "-created_at"],
+                name="core_booking_status_idx",
+            ),
+            models.Index(fields=["preferred_datetime"], name="core_booking_preferred_idx"),
+            # Matches send_due_completion_prompts
+            models.Index(
+                fields=["session_end_at"],
+                name="core_booking_prompt_due_idx",
+                condition=Q(completion_prompt_sent_at__isnull=True, is_session_completed=False),
+            ),
+        ]
+
     def __str__(self):
         return (
             f"{self.full_name} – {self.preferred_datetime.strftime('%Y-%m-%d %H:%M')}"
@@ -68,6 +97,14 @@ class LeadershipSessionBooking(models.Model):
             return self.preferred_datetime + self.session_duration.get_timedelta()
         return self.preferred_datetime
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"preferred_datetime", "session_duration"} & set(update_fields):
+            self.session_end_at = self.get_session_end_datetime() if self.session_duration_id else None
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "session_end_at"}
+        super().save(*args, **kwargs)
+
     def is_token_valid(self, hours=48):
         expiry_time = self.token_generated_at + timedelta(hours=hours)
         return timezone.now() <= expiry_time
@@ -78,6 +115,98 @@ class SendMessage(models.Model):
     email = models.EmailField()
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    fingerprint = models.CharField(max_length=64, blank=True, default="", editable=False)
+
+    class Meta:
+        indexes = [
+            # Duplicate detection in send_message
+            models.Index(fields=["fingerprint", "created_at"], name="core_sendmessage_dedupe_idx"),
+            # Admin changelist ordering and date hierarchy
+            models.Index(fields=["-created_at"], name="core_sendmessage_created_idx"),
+        ]
+
+    @staticmethod
+    def make_fingerprint(email, message):
+        """SHA-256 of the normalized sender email and message text."""
+        normalized = f"{email.strip().lower()}\n{' '.join(message.split())}"
+        return hashlib.sha256(normalized.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        if not self.fingerprint:
+            self.fingerprint = self.make_fingerprint(self.email, self.message)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Message from {self.full_name} ({self.email})"
+
+
+class EmailOutboxManager(models.Manager):
+    def enqueue(self, subject, html_content, recipient_list, from_email=None, text_content=None):
+        """
+        Stores an email for the outbox dispatcher. Call this inside the same
+        transaction as the write the email is about.
+        """
+        return self.create(
+            subject=subject,
+            html_content=html_content,
+            text_content=text_content or "",
+            from_email=from_email or "",
+            recipient_list=list(recipient_list),
+        )
+
+    def enqueue_template(self, template_name, subject, recipient_list, context=None, from_email=None):
+        """
+        Stores an email that the dispatcher renders on the worker. Model
+        instances in ``context`` are stored as references, not rendered HTML.
+        """
+        from .emails import serialize_context
+
+        return self.create(
+            subject=subject,
+            template_name=template_name,
+            context=serialize_context(context),
+            from_email=from_email or "",
+            recipient_list=list(recipient_list),
+        )
+
+
+class EmailOutbox(models.Model):
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    html_content = models.TextField(blank=True, default="")
+    template_name = models.CharField(max_length=255, blank=True, default="")
+    context = models.JSONField(default=dict, blank=True)
+    text_content = models.TextField(blank=True, default="")
+    from_email = models.CharField(max_length=254, blank=True, default="")
+    recipient_list = models.JSONField(default=list)
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    objects = EmailOutboxManager()
+
+    class Meta:
+        indexes = [
+            # Only pending rows are ever claimed by the dispatcher
+            models.Index(
+                fields=["next_attempt_at"],
+                name="core_outbox_pending_idx",
+                condition=Q(status="pending"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} → {', '.join(self.recipient_list)} ({self.status})"
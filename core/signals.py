@@ -0,0 +1,17 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from DNarai.cache import invalidate_pages
+from . import lookups
+from .models import SessionDuration, SessionFormat, SessionType
+
+
+@receiver(post_save, sender=SessionType)
+@receiver(post_save, sender=SessionDuration)
+@receiver(post_save, sender=SessionFormat)
+@receiver(post_delete, sender=SessionType)
+@receiver(post_delete, sender=SessionDuration)
+@receiver(post_delete, sender=SessionFormat)
+def lookups_changed(sender, **kwargs):
+    lookups.bump_version()
+    invalidate_pages()
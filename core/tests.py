@@ -1,3 +1,421 @@
-from django.test import TestCase
+import ipaddress
+import json
+import smtplib
+import time
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+import fakeredis
+import redis
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from DNarai import cache as app_cache
+from DNarai import metrics, redis_client
+from DNarai.paginator import EstimatedCountPaginator
+from DNarai.ratelimit import client_ip
+from DNarai.tasks import dispatch_email_outbox
+from . import lookups
+from .email_pool import EmailConnectionPool
+from .models import EmailOutbox, LeadershipSessionBooking, SendMessage, SessionDuration, SessionFormat, SessionType
+
+
+def fakeredis_caches():
+    """CACHES using Django's Redis backend against an in-memory fakeredis server."""
+    options = {"connection_class": fakeredis.FakeConnection, "server": fakeredis.FakeServer()}
+    return {
+        name: {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": "redis://fakeredis:6379/0",
+            "KEY_PREFIX": name,
+            "OPTIONS": options,
+        }
+        for name in ("default", "fragments")
+    }
+
+
+class FakeRedisMixin:
+    """Points the shared application Redis client at fakeredis for the whole class."""
+
+    @classmethod
+    def setUpClass(cls):
+        patch = mock.patch.object(redis_client, "_client", fakeredis.FakeRedis())
+        patch.start()
+        cls.addClassCleanup(patch.stop)
+        super().setUpClass()
+
+
+class Computation:
+    def __init__(self, value="computed"):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+class CacheTests(SimpleTestCase):
+    def setUp(self):
+        overrides = override_settings(CACHES=fakeredis_caches())
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        stats = mock.patch.object(app_cache, "stats", Counter())
+        stats.start()
+        self.addCleanup(stats.stop)
+
+    def test_invalidate_orphans_old_keys(self):
+        compute = Computation()
+        app_cache.get_or_compute("mentors", ("list",), compute)
+        old_key = app_cache.make_key("mentors", "list")
+
+        app_cache.invalidate("mentors")
+
+        self.assertNotEqual(app_cache.make_key("mentors", "list"), old_key)
+        app_cache.get_or_compute("mentors", ("list",), compute)
+        self.assertEqual(compute.calls, 2)
+
+    def test_invalidate_without_a_version_key(self):
+        old_key = app_cache.make_key("mentors", "list")
+        cache.delete(app_cache.VERSION_KEY.format("mentors"))  # evicted
+        app_cache.invalidate("mentors")
+        self.assertNotEqual(app_cache.make_key("mentors", "list"), old_key)
+
+    def test_cold_miss_computes_once(self):
+        compute = Computation()
+        for _ in range(5):
+            self.assertEqual(app_cache.get_or_compute("mentors", ("list",), compute), "computed")
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(app_cache.stats, Counter({("mentors", "miss"): 1, ("mentors", "hit"): 4}))
+        # The lock is released once the value is stored
+        self.assertIsNone(cache.get(app_cache.make_key("mentors", "list") + ":lock"))
+
+    def test_refreshes_early_near_expiry(self):
+        compute = Computation()
+        app_cache.get_or_compute("mentors", ("list",), compute, timeout=60)
+        key = app_cache.make_key("mentors", "list")
+        # Took a second to compute and expires in half a second
+        cache.set(key, ("old", 1.0, time.time() + 0.5), timeout=60)
+
+        with mock.patch("random.random", return_value=0.0):
+            # -log(1 - 0) == 0: not early enough to refresh
+            self.assertEqual(app_cache.get_or_compute("mentors", ("list",), compute, timeout=60), "old")
+        with mock.patch("random.random", return_value=0.99):
+            # -log(0.01) * 1s is past the expiry
+            self.assertEqual(app_cache.get_or_compute("mentors", ("list",), compute, timeout=60), "computed")
+
+        self.assertEqual(compute.calls, 2)
+        self.assertEqual(app_cache.stats[("mentors", "early")], 1)
+        value, _, expiry = cache.get(key)
+        self.assertEqual(value, "computed")
+        self.assertGreater(expiry, time.time() + 50)
+
+    def test_stale_value_served_while_another_process_refreshes(self):
+        compute = Computation()
+        app_cache.get_or_compute("mentors", ("list",), compute)
+        key = app_cache.make_key("mentors", "list")
+        cache.set(key, ("old", 1.0, time.time() - 1), timeout=60)
+        cache.add(f"{key}:lock", 1)  # held by another process
+
+        self.assertEqual(app_cache.get_or_compute("mentors", ("list",), compute), "old")
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(app_cache.stats[("mentors", "stale")], 1)
+
+    def test_cold_miss_computes_when_lock_is_taken(self):
+        compute = Computation()
+        key = app_cache.make_key("mentors", "list")
+        cache.add(f"{key}:lock", 1)
+
+        self.assertEqual(app_cache.get_or_compute("mentors", ("list",), compute), "computed")
+        self.assertEqual(compute.calls, 1)
+        self.assertEqual(cache.get(key)[0], "computed")
+
+    def test_unavailable_cache_computes_directly(self):
+        compute = Computation()
+        with self.assertLogs("DNarai.cache", "WARNING"), mock.patch.object(
+            cache, "get", side_effect=redis.ConnectionError
+        ):
+            self.assertEqual(app_cache.get_or_compute("mentors", ("list",), compute), "computed")
+        self.assertEqual(compute.calls, 1)
+
+    def test_hit_ratio(self):
+        self.assertEqual(app_cache.hit_ratio(), 0.0)
+        compute = Computation()
+        for _ in range(4):
+            app_cache.get_or_compute("mentors", ("list",), compute)
+        app_cache.get_or_compute("sessions", ("count",), compute)
+
+        self.assertEqual(app_cache.hit_ratio("mentors"), 0.75)
+        self.assertEqual(app_cache.hit_ratio("sessions"), 0.0)
+        self.assertEqual(app_cache.hit_ratio(), 0.6)
+        self.assertEqual(app_cache.hit_ratio("unknown"), 0.0)
+
+
+@override_settings(LOOKUP_CACHE_CHECK_SECONDS=0)
+class BookingLookupQueryTests(FakeRedisMixin, TestCase):
+    """The booking page serves the session lookup tables from core.lookups."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="mentee", email="mentee@example.com", password="correct horse", is_active=True
+        )
+        cls.session_type = SessionType.objects.create(name="Career")
+        cls.session_duration = SessionDuration.objects.create(label="30 minutes", duration_minutes=30)
+        cls.session_format = SessionFormat.objects.create(name="Video call")
+
+    def setUp(self):
+        state = mock.patch.dict(lookups._state, {"version": None, "checked_at": 0.0, "tables": {}})
+        state.start()
+        self.addCleanup(state.stop)
+        self.client.force_login(self.user)
+        lookups.rows(SessionType)  # warm
+
+    def lookup_queries(self, queries):
+        tables = [f'"{model._meta.db_table}"' for model in lookups.LOOKUP_MODELS]
+        return [query["sql"] for query in queries if any(table in query["sql"] for table in tables)]
+
+    def test_get_runs_no_lookup_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("core:booking"))
+        self.assertContains(response, "Video call")
+        self.assertEqual(self.lookup_queries(queries), [])
+
+    def test_post_runs_no_lookup_queries(self):
+        data = {
+            "full_name": "Ada Mentee",
+            "email": "mentee@example.com",
+            "preferred_datetime": "2030-01-01T10:00",
+            "timezone": "UTC",
+            "session_type": self.session_type.pk,
+            "session_duration": self.session_duration.pk,
+            "session_format": self.session_format.pk,
+        }
+        with self.assertLogs("core.views", "INFO"), CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("core:booking"), data)
+        self.assertRedirects(response, reverse("core:booking_success"), fetch_redirect_response=False)
+        self.assertEqual(self.lookup_queries(queries), [])
+        booking = LeadershipSessionBooking.objects.get()
+        self.assertEqual(booking.session_format_id, self.session_format.pk)
+
+    def test_post_rejects_unknown_lookup(self):
+        response = self.client.post(reverse("core:booking"), {"session_type": 999})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("session_type", response.context["form"].errors)
+
+    def test_version_bump_reloads_tables(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            SessionFormat.objects.create(name="In person")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("core:booking"))
+        self.assertContains(response, "In person")
+        self.assertEqual(len(self.lookup_queries(queries)), len(lookups.LOOKUP_MODELS))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("core:booking"))
+        self.assertEqual(self.lookup_queries(queries), [])
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class EmailOutboxDispatchTests(TestCase):
+    def test_render_error_only_fails_its_row(self):
+        broken = EmailOutbox.objects.enqueue_template(
+            "emails/does_not_exist.html", "Broken", ["mentee@example.com"], {"name": "Ada"}
+        )
+        plain = EmailOutbox.objects.enqueue("Plain", "<p>Hello</p>", ["mentor@example.com"])
+
+        with self.assertLogs("DNarai.tasks", "ERROR"):
+            self.assertEqual(dispatch_email_outbox(), {"sent": 1, "failed": 0})
+
+        self.assertEqual([message.subject for message in mail.outbox], ["Plain"])
+        plain.refresh_from_db()
+        self.assertEqual(plain.status, EmailOutbox.STATUS_SENT)
+
+        broken.refresh_from_db()
+        self.assertEqual(broken.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(broken.attempts, 1)
+        self.assertIn("emails/does_not_exist.html", broken.last_error)
+        self.assertGreater(broken.next_attempt_at, timezone.now())
+
+        # Not claimed again until its retry time
+        self.assertEqual(dispatch_email_outbox(), {"sent": 0, "failed": 0})
+        broken.refresh_from_db()
+        self.assertEqual(broken.attempts, 1)
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=1)
+    def test_render_error_gives_up_after_max_attempts(self):
+        broken = EmailOutbox.objects.enqueue_template("emails/does_not_exist.html", "Broken", ["mentee@example.com"])
+
+        with self.assertLogs("DNarai.tasks", "ERROR"):
+            self.assertEqual(dispatch_email_outbox(), {"sent": 0, "failed": 1})
+
+        broken.refresh_from_db()
+        self.assertEqual(broken.status, EmailOutbox.STATUS_FAILED)
+
+
+class ClientIpTests(SimpleTestCase):
+    def request(self, forwarded_for=None):
+        headers = {"HTTP_X_FORWARDED_FOR": forwarded_for} if forwarded_for else {}
+        return RequestFactory().get("/", REMOTE_ADDR="172.18.0.5", **headers)
+
+    @override_settings(RATELIMIT_TRUST_PROXY_HEADERS=False)
+    def test_ignores_headers_by_default(self):
+        self.assertEqual(client_ip(self.request("203.0.113.7")), "172.18.0.5")
+
+    @override_settings(RATELIMIT_TRUST_PROXY_HEADERS=True, RATELIMIT_TRUSTED_PROXIES=[])
+    def test_right_most_hop_behind_nginx(self):
+        self.assertEqual(client_ip(self.request("203.0.113.7")), "203.0.113.7")
+        # The client can't choose its address by sending the header itself
+        self.assertEqual(client_ip(self.request("1.2.3.4, 203.0.113.7")), "203.0.113.7")
+        self.assertEqual(client_ip(self.request()), "172.18.0.5")
+
+    @override_settings(
+        RATELIMIT_TRUST_PROXY_HEADERS=True,
+        RATELIMIT_TRUSTED_PROXIES=[ipaddress.ip_network("10.0.0.0/8")],
+    )
+    def test_skips_trusted_proxies(self):
+        self.assertEqual(client_ip(self.request("1.2.3.4, 203.0.113.7, 10.1.2.3")), "203.0.113.7")
+        self.assertEqual(client_ip(self.request("10.0.0.2, 10.1.2.3")), "10.0.0.2")
+
+
+@override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1000)
+class EstimatedCountPaginatorTests(TestCase):
+    """Postgres is simulated: the vendor, the pg_class estimate and EXPLAIN are mocked."""
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(connection, "vendor", "postgresql"),
+            mock.patch.object(EstimatedCountPaginator, "_table_estimate", return_value=50000),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def count(self, queryset, plan):
+        with mock.patch.object(type(queryset), "explain", return_value=plan):
+            with CaptureQueriesContext(connection) as queries:
+                count = EstimatedCountPaginator(queryset, 100).count
+        return count, [query["sql"] for query in queries if "COUNT(" in query["sql"].upper()]
+
+    def test_unfiltered_uses_table_estimate(self):
+        count, exact = self.count(LeadershipSessionBooking.objects.order_by("pk"), "unused")
+        self.assertEqual((count, exact), (50000, []))
+
+    def test_filtered_uses_plan_estimate(self):
+        queryset = LeadershipSessionBooking.objects.filter(is_mentor_confirmed=False).order_by("pk")
+        # Django returns the JSON plan as one object, some drivers as a list of them
+        for plan in ({"Plan": {"Plan Rows": 4200}}, [{"Plan": {"Plan Rows": 4200}}]):
+            with self.subTest(plan=plan):
+                self.assertEqual(self.count(queryset, json.dumps(plan)), (4200, []))
+
+    def test_filtered_small_estimate_counts_exactly(self):
+        queryset = LeadershipSessionBooking.objects.filter(is_mentor_confirmed=False).order_by("pk")
+        count, exact = self.count(queryset, json.dumps({"Plan": {"Plan Rows": 10}}))
+        self.assertEqual(count, 0)
+        self.assertEqual(len(exact), 1)
+
+    def test_unexpected_plan_counts_exactly(self):
+        queryset = LeadershipSessionBooking.objects.filter(is_mentor_confirmed=False).order_by("pk")
+        for plan in (json.dumps({"Node Type": "Seq Scan"}), json.dumps([]), "not json"):
+            with self.subTest(plan=plan):
+                count, exact = self.count(queryset, plan)
+                self.assertEqual((count, len(exact)), (0, 1))
+
+
+class FakeSMTPBackend:
+    """Stands in for Django's SMTP EmailBackend: ``connection`` is None while closed."""
+
+    def __init__(self, reconnects=True):
+        self.connection = None
+        self.reconnects = reconnects
+        self.opens = 0
+
+    def open(self):
+        if self.opens and not self.reconnects:
+            raise OSError("Connection refused")
+        self.opens += 1
+        self.connection = mock.Mock(**{"noop.return_value": (250, b"OK")})
+
+    def close(self):
+        self.connection = None
+
+
+class EmailConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.pool = EmailConnectionPool(max_connections=1, idle_timeout=60, healthcheck_interval=0.001, timeout=1)
+
+    def send(self, backend, messages):
+        with mock.patch("core.email_pool.get_connection", return_value=backend):
+            return self.pool.send_messages(messages)
+
+    def message(self, *errors):
+        return mock.Mock(**{"send.side_effect": list(errors) or None})
+
+    def test_reconnects_once_and_keeps_the_connection(self):
+        backend = FakeSMTPBackend()
+        messages = [self.message(smtplib.SMTPServerDisconnected(), None), self.message()]
+        self.assertEqual(self.send(backend, messages), [])
+        self.assertEqual(backend.opens, 2)
+        self.assertEqual([connection for connection, _ in self.pool._idle], [backend])
+
+    def test_failed_reconnect_discards_the_connection(self):
+        backend = FakeSMTPBackend(reconnects=False)
+        messages = [self.message(), self.message(smtplib.SMTPServerDisconnected()), self.message()]
+        with self.assertLogs("core.email_pool", "WARNING"):
+            failed = self.send(backend, messages)
+
+        self.assertEqual([message for message, _ in failed], messages[1:])
+        messages[2].send.assert_not_called()
+        self.assertIsNone(backend.connection)
+        self.assertEqual(self.pool._idle, [])
+
+    def test_closed_connection_is_not_alive(self):
+        backend = FakeSMTPBackend()
+        self.assertFalse(EmailConnectionPool._is_alive(backend))
+        backend.open()
+        self.assertTrue(EmailConnectionPool._is_alive(backend))
+
+
+@override_settings(CELERY_BROKER_URL="redis://broker:6379/0", METRICS_CELERY_QUEUES=["celery"])
+class BacklogCollectorTests(FakeRedisMixin, TestCase):
+    def test_scrapes_share_one_broker_client(self):
+        broker = fakeredis.FakeRedis()
+        broker.rpush("celery", "a", "b")
+        with mock.patch.object(metrics, "_broker_client", None):
+            with mock.patch("redis.Redis.from_url", return_value=broker) as from_url:
+                for _ in range(3):
+                    depth = next(metrics.BacklogCollector().collect())
+                    self.assertEqual([sample.value for sample in depth.samples], [2])
+        from_url.assert_called_once()
+
+
+@override_settings(APP_SERVER="wsgi")
+class ContactMessageTests(TestCase):
+    data = {"full_name": "Ada Lovelace", "email": "ada@example.com", "message": "Hello"}
+
+    def setUp(self):
+        patch = mock.patch.object(redis_client, "_client", fakeredis.FakeRedis())
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def send(self):
+        return self.client.post(reverse("core:send_message"), self.data, headers={"x-requested-with": "XMLHttpRequest"})
+
+    def test_repeat_is_rejected(self):
+        self.send()
+        self.assertContains(self.send(), "already sent this message")
+        self.assertEqual(SendMessage.objects.count(), 1)
+
+    def test_retry_after_failed_save_is_accepted(self):
+        with mock.patch("core.views._save_contact_message", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.send()
+        self.assertContains(self.send(), "Your message has been sent")
+        self.assertEqual(SendMessage.objects.count(), 1)
@@ -0,0 +1,84 @@
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.http import Http404
+from django.utils import timezone
+
+from .models import LeadershipSessionBooking
+
+# Tokens stored on the booking by older releases (uuid4().hex)
+LEGACY_TOKEN_RE = re.compile(r"^[0-9a-f]{32}$")
+
+PURPOSES = {
+    # purpose: (signing salt, legacy token field)
+    "confirm": ("core.booking.confirm", "mentor_confirmation_token"),
+    "complete": ("core.booking.complete", "session_completion_token"),
+}
+
+
+def _signer(purpose):
+    return signing.TimestampSigner(salt=PURPOSES[purpose][0])
+
+
+def _max_age():
+    return timedelta(hours=settings.BOOKING_LINK_MAX_AGE_HOURS)
+
+
+def make_booking_token(booking, purpose):
+    """Signs the booking ID for a link; no DB state is needed to verify it."""
+    return _signer(purpose).sign(signing.b62_encode(booking.pk))
+
+
+def booking_link_token(booking, purpose):
+    """The token to put in an emailed link for ``booking``."""
+    if settings.SIGNED_LINK_TOKENS:
+        return make_booking_token(booking, purpose)
+    return getattr(booking, PURPOSES[purpose][1])
+
+
+def _legacy_booking_id(row, check_expiry):
+    if row is None:
+        raise Http404("Unknown link")
+    booking_id, generated_at = row
+    if check_expiry and timezone.now() > generated_at + _max_age():
+        raise signing.SignatureExpired("Link expired")
+    return booking_id
+
+
+def _legacy_lookup(token, purpose):
+    return LeadershipSessionBooking.objects.filter(
+        **{PURPOSES[purpose][1]: token}
+    ).values_list("pk", "token_generated_at")
+
+
+def _signed_booking_id(token, purpose, check_expiry):
+    try:
+        value = _signer(purpose).unsign(token, max_age=_max_age() if check_expiry else None)
+    except signing.SignatureExpired:
+        raise
+    except signing.BadSignature:
+        raise Http404("Unknown link")
+    return signing.b62_decode(value)
+
+
+def booking_id_from_token(token, purpose, check_expiry=True):
+    """
+    Returns the ID of the booking a link token refers to.
+
+    Signed tokens are verified in memory, so tampered or expired links are
+    rejected before any query. Legacy hex tokens are still looked up in the
+    database. Raises ``Http404`` for unknown tokens and
+    ``signing.SignatureExpired`` for expired ones.
+    """
+    if LEGACY_TOKEN_RE.match(token):
+        return _legacy_booking_id(_legacy_lookup(token, purpose).first(), check_expiry)
+    return _signed_booking_id(token, purpose, check_expiry)
+
+
+async def abooking_id_from_token(token, purpose, check_expiry=True):
+    """Async version of ``booking_id_from_token``."""
+    if LEGACY_TOKEN_RE.match(token):
+        return _legacy_booking_id(await _legacy_lookup(token, purpose).afirst(), check_expiry)
+    return _signed_booking_id(token, purpose, check_expiry)
@@ -1,158 +1,271 @@
 import uuid
 import logging
-from datetime import timedelta, timezone as dt_timezone  # Updated for Django 5
+import redis
+from asgiref.sync import sync_to_async
+from datetime import timedelta
 from django.conf import settings
-from django.http import HttpResponse
+from django.core import signing
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.template.loader import render_to_string
 from django.utils import timezone
-from django.utils.timezone import make_naive
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 
 from .forms import LeadershipSessionBookingForm
-from .models import LeadershipSessionBooking, SendMessage
-from DNarai.tasks import (
-    send_session_completion_email,
-    send_email_task,
-)
+from .models import EmailOutbox, LeadershipSessionBooking, SendMessage
+from .tokens import abooking_id_from_token, booking_link_token
+from DNarai.cache import cached_page
+from DNarai.ratelimit import ratelimit
+from DNarai.redis_client import get_async_redis, get_redis, use_async_redis
 
 logger = logging.getLogger(__name__)
 
 
+@cached_page("index")
 def index(request):
     """Homepage view"""
     return render(request, "core/index.html")
 
 
+def create_booking(form, request):
+    """Saves the booking with its notification emails in one transaction."""
+    booking = form.save(commit=False)
+    booking.mentor_confirmation_token = uuid.uuid4().hex
+    booking.session_completion_token = uuid.uuid4().hex
+    booking.token_generated_at = timezone.now()
+
+    mentor_email = getattr(settings, "DEFAULT_MENTOR_EMAIL", "admin@example.com")
+
+    # Booking and its notification emails are committed together
+    with transaction.atomic():
+        booking.save()
+        mentor_link = request.build_absolute_uri(
+            f"/confirm-session/{booking_link_token(booking, 'confirm')}/"
+        )
+
+        # Confirmation to mentee (rendered by the worker)
+        EmailOutbox.objects.enqueue_template(
+            "emails/mentee_confirmation.html",
+            "Mentorship Session Booking Confirmation",
+            [booking.email],
+            {"booking": booking},
+            settings.DEFAULT_FROM_EMAIL,
+        )
+
+        # Invite to mentor (rendered by the worker)
+        EmailOutbox.objects.enqueue_template(
+            "emails/mentor_invite.html",
+            "New Mentorship Session Request",
+            [mentor_email],
+            {"booking": booking, "mentor_link": mentor_link},
+            settings.DEFAULT_FROM_EMAIL,
+        )
+    logger.info("Queued booking confirmation to mentee %s and invite to mentor %s", booking.email, mentor_email)
+
+    # The completion prompt is sent by send_due_completion_prompts once session_end_at passes
+    return booking
+
+
 @login_required(login_url="accounts:login")
-def booking_view(request):
+async def booking_view(request):
     """Handles session booking by mentees"""
     if request.method == "POST":
         form = LeadershipSessionBookingForm(request.POST)
-        if form.is_valid():
-            booking = form.save(commit=False)
-            booking.mentor_confirmation_token = uuid.uuid4().hex
-            booking.session_completion_token = uuid.uuid4().hex
-            booking.token_generated_at = timezone.now()
-            booking.save()
-
-            # Schedule session completion reminder email
-            session_duration = booking.session_duration.get_timedelta()
-            run_eta = booking.preferred_datetime + session_duration
-            send_session_completion_email.apply_async(
-                (booking.id,),
-                eta=make_naive(run_eta, timezone=dt_timezone.utc)  # Fixed for Django 5
-            )
-            logger.info(f"Scheduled completion email for booking ID {booking.id} at {run_eta}")
-
-            # Send confirmation to mentee (async)
-            html_mentee = render_to_string("emails/mentee_confirmation.html", {"booking": booking})
-            send_email_task.delay(
-                "Mentorship Session Booking Confirmation",
-                html_mentee,
-                [booking.email],
-                settings.DEFAULT_FROM_EMAIL,
-            )
-            logger.info(f"Queued booking confirmation to mentee: {booking.email}")
-
-            # Send invite to mentor (async)
-            mentor_email = getattr(settings, "DEFAULT_MENTOR_EMAIL", "admin@example.com")
-            mentor_link = request.build_absolute_uri(
-                f"/confirm-session/{booking.mentor_confirmation_token}/"
-            )
-            html_mentor = render_to_string(
-                "emails/mentor_invite.html", {"booking": booking, "mentor_link": mentor_link}
-            )
-            send_email_task.delay(
-                "New Mentorship Session Request",
-                html_mentor,
-                [mentor_email],
-                settings.DEFAULT_FROM_EMAIL,
-            )
-            logger.info(f"Queued mentor invite email to: {mentor_email}")
-
+        # Validation queries the lookup tables for the choice fields
+        if await sync_to_async(form.is_valid)():
+            await sync_to_async(create_booking)(form, request)
             return redirect("core:booking_success")
     else:
         form = LeadershipSessionBookingForm()
 
-    return render(request, "core/booking.html", {"form": form})
+    return await sync_to_async(render)(request, "core/booking.html", {"form": form})
 
 
 @login_required(login_url="accounts:login")
+@cached_page("booking_success", anonymous_only=False)  # same for every user
 def booking_success_view(request):
     """Booking success page"""
     return render(request, "core/booking_success.html")
 
 
+def confirm_booking(booking_id):
+    """
+    Marks the booking confirmed and queues the mentee's email. Returns False
+    if it was already confirmed.
+    """
+    with transaction.atomic():
+        booking = get_object_or_404(LeadershipSessionBooking.objects.select_for_update(), pk=booking_id)
+
+        if booking.is_mentor_confirmed:
+            return False
+
+        booking.is_mentor_confirmed = True
+        booking.confirmed_at = timezone.now()
+        booking.save(update_fields=["is_mentor_confirmed", "confirmed_at"])
+
+        # Notify mentee (rendered by the worker)
+        EmailOutbox.objects.enqueue_template(
+            "emails/session_confirmed_mentee.html",
+            "Your Mentorship Session is Confirmed!",
+            [booking.email],
+            {"booking": booking},
+            settings.DEFAULT_FROM_EMAIL,
+        )
+    logger.info("Session %s confirmed by mentor", booking.id)
+    return True
+
+
 @login_required(login_url="accounts:login")
-def confirm_session_view(request, token):
+async def confirm_session_view(request, token):
     """Mentor confirms session"""
-    booking = get_object_or_404(LeadershipSessionBooking, mentor_confirmation_token=token)
-
-    if hasattr(booking, "is_token_valid") and not booking.is_token_valid():
+    try:
+        booking_id = await abooking_id_from_token(token, "confirm")
+    except signing.SignatureExpired:
         return HttpResponse("This link has expired. Please request a new confirmation.")
 
-    if booking.is_mentor_confirmed:
+    if not await sync_to_async(confirm_booking)(booking_id):
         return HttpResponse("This session has already been confirmed.")
 
-    booking.is_mentor_confirmed = True
-    booking.confirmed_at = timezone.now()
-    booking.save()
-
-    # Notify mentee (async)
-    html_content = render_to_string("emails/session_confirmed_mentee.html", {"booking": booking})
-    send_email_task.delay(
-        "Your Mentorship Session is Confirmed!",
-        html_content,
-        [booking.email],
-        settings.DEFAULT_FROM_EMAIL,
-    )
-    logger.info(f"Session {booking.id} confirmed by mentor")
-
-    return render(request, "core/mentor_confirmation_msg.html")
+    return await sync_to_async(render)(request, "core/mentor_confirmation_msg.html")
 
 
-def complete_session_view(request, token):
+async def complete_session_view(request, token):
     """Mentee confirms session completion"""
-    booking = get_object_or_404(LeadershipSessionBooking, session_completion_token=token)
-
-    if hasattr(booking, "is_token_valid") and not booking.is_token_valid():
+    try:
+        booking_id = await abooking_id_from_token(token, "complete")
+    except signing.SignatureExpired:
         return HttpResponse("This link has expired.")
 
-    if booking.is_session_completed:
-        return HttpResponse("Session already marked as completed.")
+    updated = await LeadershipSessionBooking.objects.filter(
+        pk=booking_id, is_session_completed=False
+    ).aupdate(is_session_completed=True, completed_at=timezone.now())
 
-    booking.is_session_completed = True
-    booking.completed_at = timezone.now()
-    booking.save()
+    if not updated:
+        return HttpResponse("Session already marked as completed.")
 
     return HttpResponse("Thanks for confirming! The session is now marked as completed.")
 
 
 @login_required(login_url="accounts:login")
-def mark_session_held(request, token):
+async def mark_session_held(request, token):
     """Admin marks session as held"""
-    booking = get_object_or_404(LeadershipSessionBooking, session_completion_token=token)
-    booking.is_session_held = True
-    booking.is_session_completed = True
-    booking.completed_at = timezone.now()
-    booking.save()
+    booking_id = await abooking_id_from_token(token, "complete", check_expiry=False)
+    updated = await LeadershipSessionBooking.objects.filter(pk=booking_id).aupdate(
+        is_session_held=True, is_session_completed=True, completed_at=timezone.now()
+    )
+    if not updated:
+        raise Http404("No LeadershipSessionBooking matches the given query.")
     return HttpResponse("Thanks! You've confirmed the session was held.")
 
 
 @login_required(login_url="accounts:login")
-def mark_session_not_held(request, token):
+async def mark_session_not_held(request, token):
     """Admin marks session as not held"""
-    booking = get_object_or_404(LeadershipSessionBooking, session_completion_token=token)
-    booking.is_session_held = False
-    booking.is_session_completed = False
-    booking.completed_at = timezone.now()
-    booking.save()
+    booking_id = await abooking_id_from_token(token, "complete", check_expiry=False)
+    updated = await LeadershipSessionBooking.objects.filter(pk=booking_id).aupdate(
+        is_session_held=False, is_session_completed=False, completed_at=timezone.now()
+    )
+    if not updated:
+        raise Http404("No LeadershipSessionBooking matches the given query.")
     return HttpResponse("Thanks! You've indicated that the session did not take place.")
 
 
-def send_message(request):
+def _fingerprint_key(fingerprint):
+    return f"contact:fingerprint:{fingerprint}"
+
+
+def _recent_messages(fingerprint, window):
+    return SendMessage.objects.filter(fingerprint=fingerprint, created_at__gte=timezone.now() - window)
+
+
+def is_recent_duplicate(fingerprint, window=timedelta(minutes=5)):
+    """
+    Claims ``fingerprint`` for ``window`` with a single Redis SET NX EX.
+    Falls back to the (fingerprint, created_at) index if Redis is down.
+    """
+    try:
+        claimed = get_redis().set(_fingerprint_key(fingerprint), 1, nx=True, ex=int(window.total_seconds()))
+        return not claimed
+    except redis.RedisError:
+        logger.warning("Redis unavailable for duplicate check, using the database", exc_info=True)
+        return _recent_messages(fingerprint, window).exists()
+
+
+async def ais_recent_duplicate(fingerprint, window=timedelta(minutes=5)):
+    """Async version of ``is_recent_duplicate``."""
+    if not use_async_redis():
+        return await sync_to_async(is_recent_duplicate)(fingerprint, window)
+    try:
+        claimed = await get_async_redis().set(
+            _fingerprint_key(fingerprint), 1, nx=True, ex=int(window.total_seconds())
+        )
+        return not claimed
+    except redis.RedisError:
+        logger.warning("Redis unavailable for duplicate check, using the database", exc_info=True)
+        return await _recent_messages(fingerprint, window).aexists()
+
+
+def release_fingerprint(fingerprint):
+    """Drops the claim taken by ``is_recent_duplicate`` so a retry isn't rejected."""
+    try:
+        get_redis().delete(_fingerprint_key(fingerprint))
+    except redis.RedisError:
+        logger.warning("Could not release duplicate-check claim", exc_info=True)
+
+
+def save_contact_message(full_name, email, message_content, fingerprint):
+    """
+    Saves the message and queues both notification emails atomically. If that
+    fails, the fingerprint claim is released so the sender can retry.
+    """
+    try:
+        _save_contact_message(full_name, email, message_content, fingerprint)
+    except Exception:
+        release_fingerprint(fingerprint)
+        raise
+
+
+def _save_contact_message(full_name, email, message_content, fingerprint):
+    first_name = full_name.split()[0]
+
+    with transaction.atomic():
+        # Save message
+        SendMessage.objects.create(
+            full_name=full_name, email=email, message=message_content, fingerprint=fingerprint
+        )
+
+        # Confirmation email to sender (rendered by the worker)
+        EmailOutbox.objects.enqueue_template(
+            "emails/confirmation_email.html",
+            "Thank you for contacting us",
+            [email],
+            {"first_name": first_name, "message": message_content},
+            settings.DEFAULT_FROM_EMAIL,
+        )
+
+        # Notification email to admin (rendered by the worker)
+        EmailOutbox.objects.enqueue_template(
+            "emails/admin_notification_email.html",
+            f"New contact message from {full_name}",
+            [settings.EMAIL_HOST_USER],
+            {"full_name": full_name, "email": email, "message": message_content},
+            settings.DEFAULT_FROM_EMAIL,
+        )
+
+
+def render_contact_response(request):
+    messages_html = render_to_string("partials/messages.html", {"messages": messages.get_messages(request)})
+
+    if request.headers.get("x-requested-with") == "XMLHttpRequest":
+        return HttpResponse(messages_html)
+
+    return render(request, "core/index.html")
+
+
+@ratelimit("contact", keys=("ip", "email"))
+async def send_message(request):
     """Contact form for general messages"""
     if request.method == "POST":
         full_name = request.POST.get("full_name")
@@ -160,61 +273,31 @@ def send_message(request):
         message_content = request.POST.get("message")
 
         if full_name and email and message_content:
-            five_minutes_ago = timezone.now() - timedelta(minutes=5)
-            duplicate = SendMessage.objects.filter(
-                email=email, message=message_content, created_at__gte=five_minutes_ago
-            ).exists()
+            fingerprint = SendMessage.make_fingerprint(email, message_content)
 
-            if duplicate:
+            if await ais_recent_duplicate(fingerprint):
                 messages.error(request, "You've already sent this message recently. Please wait before sending again.")
             else:
-                first_name = full_name.split()[0]
-
-                # Save message
-                SendMessage.objects.create(full_name=full_name, email=email, message=message_content)
-
-                # Confirmation email to sender (async)
-                html_message_user = render_to_string(
-                    "emails/confirmation_email.html",
-                    {"first_name": first_name, "message": message_content},
-                )
-                send_email_task.delay(
-                    "Thank you for contacting us",
-                    html_message_user,
-                    [email],
-                    settings.DEFAULT_FROM_EMAIL,
-                )
-
-                # Notification email to admin (async)
-                html_message_admin = render_to_string(
-                    "emails/admin_notification_email.html",
-                    {"full_name": full_name, "email": email, "message": message_content},
-                )
-                send_email_task.delay(
-                    f"New contact message from {full_name}",
-                    html_message_admin,
-                    [settings.EMAIL_HOST_USER],
-                    settings.DEFAULT_FROM_EMAIL,
-                )
-
+                await sync_to_async(save_contact_message)(full_name, email, message_content, fingerprint)
                 messages.success(request, "Your message has been sent. Please check your email for confirmation.")
         else:
             messages.error(request, "Please fill out all the fields.")
 
-        messages_html = render_to_string("partials/messages.html", {"messages": messages.get_messages(request)})
+        # Message storage and the page template may touch the session and user
+        return await sync_to_async(render_contact_response)(request)
 
-        if request.headers.get("x-requested-with") == "XMLHttpRequest":
-            return HttpResponse(messages_html)
+    return await sync_to_async(render)(request, "core/index.html")
 
-        return render(request, "core/index.html")
 
-    return render(request, "core/index.html")
+@cached_page("404", statuses=(404,), anonymous_only=False)
+def render_404(request):
+    # 404.html doesn't show the path, so one rendering serves every URL
+    return render(request, "404.html", status=404)
 
 
 def custom_404(request, exception):
     """Custom 404 handler"""
     logger.info("404 at %s", request.build_absolute_uri())
-    context = {"path": request.path}
-    response = render(request, "404.html", context=context, status=404)
+    response = render_404(request)
     response["Cache-Control"] = "no-store"
     return response